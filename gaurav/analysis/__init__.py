@@ -2,4 +2,7 @@ from .function import *  # Import everything from functions.py
 from .calculate import *  # Import everything from functions.py
 from .manage import *  # Import everything from functions.py
 from .read import *  # Import everything from functions.py
-from .write import *  # Import everything from functions.py
\ No newline at end of file
+from .store import *  # Import everything from functions.py
+from .trace import *  # Import everything from functions.py
+from .write import *  # Import everything from functions.py
+from .cube import *  # Import everything from functions.py
\ No newline at end of file
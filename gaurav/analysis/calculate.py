@@ -1,58 +1,40 @@
-import streamlit as st
+import logging
 import pandas as pd
+import numpy as np
 from datetime import datetime, timedelta
-import schedule
-import time
 import auth as gu_auth
-import threading
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from email.mime.base import MIMEBase
-from email import encoders
-import smtplib
-import ssl
 import io
-
-
-def send_email_via_hostinger_for_performance_tracker(sender_email, receiver_email, subject, filtered_data, password, num_days):
-    """Send email with HTML content and Excel attachment"""
-    try:
-        smtp_server = "smtp.hostinger.com"
-        smtp_port = 587
-        
-        message = MIMEMultipart("alternative")
-        message["From"] = sender_email
-        message["To"] = receiver_email
-        message["Subject"] = subject
-        
-        # Create and attach HTML content
-        html_content = create_email_html(filtered_data, num_days)
-        if html_content:
-            message.attach(MIMEText(html_content, "html"))
-        
-        # Create Excel attachment
-        excel_buffer = io.BytesIO()
-        with pd.ExcelWriter(excel_buffer, engine='xlsxwriter') as writer:
-            for group_name, group_data in filtered_data.groupby('Undercontrol'):
-                group_data.to_excel(writer, sheet_name=str(group_name), index=False)
-        
-        excel_buffer.seek(0)
-        part = MIMEBase("application", "octet-stream")
-        part.set_payload(excel_buffer.getvalue())
-        encoders.encode_base64(part)
-        part.add_header("Content-Disposition", "attachment", filename="Performance_Report.xlsx")
-        message.attach(part)
-        
-        # Send email
-        context = ssl.create_default_context()
-        with smtplib.SMTP(smtp_server, smtp_port) as server:
-            server.starttls(context=context)
-            server.login(sender_email, password)
-            server.sendmail(sender_email, receiver_email, message.as_string())
-            st.success(f"Email sent successfully to {receiver_email}!")
-            
-    except Exception as e:
-        st.error(f"Error sending email to {receiver_email}: {str(e)}")
+import config
+import data as data_func
+from .read import read_sheet, has_sheet
+from .write import write_artifact
+from .rolling import calculate_normal_drr
+from .projection import max_sustainable_drr, drr_timeline
+from .shard import run_sharded
+from .trace import traced
+
+logger = logging.getLogger(__name__)
+
+
+def performance_report_message(sender_email, subject, filtered_data, num_days):
+    """Performance report mail with HTML KPIs and the Excel workbook, built once per batch"""
+    excel_buffer = io.BytesIO()
+    with pd.ExcelWriter(excel_buffer, engine='xlsxwriter') as writer:
+        for group_name, group_data in filtered_data.groupby('Undercontrol'):
+            group_data.to_excel(writer, sheet_name=str(group_name), index=False)
+    return data_func.build_message(sender_email, subject,
+                                   html=create_email_html(filtered_data, num_days),
+                                   attachments=[("Performance_Report.xlsx", excel_buffer.getvalue())])
+
+def send_email_via_hostinger_for_performance_tracker(sender_email, receiver_emails, subject, filtered_data, password, num_days):
+    """
+    Send the performance report to every receiver over one SMTP connection.
+    Returns {receiver: error} for the receivers that could not be reached.
+    """
+    if isinstance(receiver_emails, str):
+        receiver_emails = [receiver_emails]
+    message = performance_report_message(sender_email, subject, filtered_data, num_days)
+    return data_func.send_batch(sender_email, password, list(receiver_emails), message)
 def create_email_html(filtered_data, num_days):
     """Create HTML email content with KPIs"""
     try:
@@ -149,161 +131,242 @@ def create_email_html(filtered_data, num_days):
         </html>
         """
         return html
-    except Exception as e:
-        st.error(f"Error creating email HTML: {str(e)}")
+    except Exception:
+        # The report still goes out with its attachment
+        logger.exception("Error creating email HTML")
         return None
-def schedule_email(sender_email, receiver_emails, subject, filtered_data, password, num_days, schedule_time):
-    """Schedule email to be sent at specified time"""
-    def job():
-        for receiver_email in receiver_emails:
-            gu_auth.send_email_via_hostinger(sender_email, receiver_email, subject, filtered_data, password, num_days)
-    
-    schedule.every().day.at(schedule_time).do(job)
-    
-    def run_scheduler():
-        while True:
-            schedule.run_pending()
-            time.sleep(60)
-    
-    scheduler_thread = threading.Thread(target=run_scheduler)
-    scheduler_thread.daemon = True
-    scheduler_thread.start()
-
-def calculate_daily_loss_report(file_path, sheet_name, decimal_places=2):
+def schedule_email(receiver_emails, subject, uploaded_file, num_days, frequency, schedule_datetime,
+                   weekdays=None, monthly_day=None, performance_filter=None, pin_workbook=False, user=None):
+    """
+    Store a report schedule and make sure the scheduler worker runs. The report is
+    recomputed at every send from the latest Performance Tracker upload, which
+    uploaded_file becomes, or with pin_workbook=True always from uploaded_file. It is
+    sent from the server's SMTP account.
+    """
+    data_func.save_upload(uploaded_file, config.PERFORMANCE_WORKBOOK_PATH, user)
+    workbook = data_func.pin_report_workbook(uploaded_file) if pin_workbook else None
+    schedule_id = data_func.add_report_schedule(receiver_emails, subject, num_days, frequency, schedule_datetime,
+                                                weekdays, monthly_day, performance_filter, workbook=workbook)
+    data_func.start_report_scheduler(force=True)
+    return schedule_id
+
+def calculate_daily_loss_report(file_path, sheet_name, decimal_places=2, per_asin=False, rolling_window=None):
+    """
+    Total loss and number of loss-making products per date, latest date first.
+
+    Works on the wide sheet (ASIN, Product Name, one column per date) as a single numeric
+    matrix. rolling_window=N adds 'Rolling Loss', the loss over the last N date columns.
+    per_asin=True also returns a per-product breakdown: (report_df, asin_loss_df).
+    """
     # Load the data from the specified Excel sheet
-    data = pd.read_excel(file_path, sheet_name=sheet_name)
+    data = read_sheet(file_path, sheet_name)
 
     # Ensure the data is a DataFrame
-    if isinstance(data, pd.DataFrame):
-        # Dictionary to store the results for each day
-        daily_report = {}
-
-        # Loop through each product row starting from the second row (index 1)
-        for index, row in data.iterrows():
-            product_name = row[1]  # assuming the second column is product name
-            ASIN = row[0]  # assuming the first column contains the ASIN
-
-            # Extract the profit data excluding ASIN and product name (which are in columns 0 and 1)
-            profit_data = row[2:]
-
-            # Loop through each day's profit and calculate losses (if any)
-            for date, profit in profit_data.items():
-                if profit < 0:  # Loss condition
-                    if date not in daily_report:
-                        daily_report[date] = {'Total Loss': 0, 'Product Count': 0}
-                    daily_report[date]['Total Loss'] += profit
-                    daily_report[date]['Product Count'] += 1
+    if not isinstance(data, pd.DataFrame):
+        raise ValueError("Input data must be a pandas DataFrame.")
 
-        # Round the total losses to the specified number of decimal places
-        for date, report in daily_report.items():
-            report['Total Loss'] = round(report['Total Loss'], decimal_places)
+    # Everything after the ASIN and product name columns is one profit column per date
+    dates = pd.Index(data.columns[2:].tolist())
+    profit = data.iloc[:, 2:].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+    loss_mask = profit < 0
+    losses = np.where(loss_mask, profit, 0.0)
+
+    total_loss = losses.sum(axis=0)
+    product_count = loss_mask.sum(axis=0)
+    has_loss = product_count > 0
+
+    report_df = pd.DataFrame({
+        'Total Loss': [round(total, decimal_places) for total in total_loss[has_loss]],
+        'Product Count': product_count[has_loss],
+    }, index=dates[has_loss])
+
+    if rolling_window:
+        # Rolling over consecutive date columns in date order, including days without losses
+        chronological = np.argsort(np.asarray(dates, dtype=object), kind='stable')
+        rolling = pd.Series(total_loss[chronological]).rolling(rolling_window, min_periods=1).sum().to_numpy()
+        rolling_loss = pd.Series(rolling, index=dates[chronological]).round(decimal_places)
+        report_df['Rolling Loss'] = rolling_loss[report_df.index].to_numpy()
+
+    # Sort the DataFrame by the index (date) in descending order (latest dates first)
+    report_df = report_df.sort_index(ascending=False)
+
+    if per_asin:
+        asin_loss_df = pd.DataFrame({
+            'ASIN': data.iloc[:, 0].to_numpy(),
+            'Product Name': data.iloc[:, 1].to_numpy(),
+            'Total Loss': losses.sum(axis=1).round(decimal_places),
+            'Loss Days': loss_mask.sum(axis=1),
+        }).sort_values('Total Loss')
+        return report_df, asin_loss_df
+    return report_df
+    
 
-        # Convert the daily report dictionary to a DataFrame
-        report_df = pd.DataFrame.from_dict(daily_report, orient='index')
 
-        # Sort the DataFrame by the index (date) in descending order (latest dates first)
-        report_df = report_df.sort_index(ascending=False)
 
-        # Write the report to a CSV file
-       
+def calculate_change_metrics(file_path, sheet_names=("Profit", "Sales"), windows=config.CHANGE_WINDOWS, decimal_places=2):
+    """
+    Recent-window averages and percentage changes for every product of the given wide sheets.
+
+    The sheets list the latest date first, so "Today's Data" is the first date column and
+    window w averages the first w date columns. All sheets are stacked into one matrix and
+    every window comes from the same cumulative sums. Nothing is written to disk.
+
+    Returns a tidy frame: Sheet, ASIN, Product Name, Window, Today's Data, Average,
+    Percentage Change (NaN where the average is 0 or the sheet has fewer than w dates).
+    """
+    windows = sorted(windows)
+    width = windows[-1]
+    keys, blocks, available = [], [], []
+    for sheet_name in sheet_names:
+        data = read_sheet(file_path, sheet_name)
+        values = data.iloc[:, 2:2 + width].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+        block = np.full((len(data), width), np.nan)
+        block[:, :values.shape[1]] = values
+        blocks.append(block)
+        available.append(np.full(len(data), data.shape[1] - 2))
+        keys.append(pd.DataFrame({
+            'Sheet': sheet_name,
+            'ASIN': data.iloc[:, 0].to_numpy(),
+            'Product Name': data.iloc[:, 1].to_numpy(),
+        }))
+    keys = pd.concat(keys, ignore_index=True)
+    values = np.vstack(blocks)
+    available = np.concatenate(available)
+
+    window_index = np.array(windows) - 1
+    window_sums = np.cumsum(np.nan_to_num(values), axis=1)[:, window_index]
+    window_counts = np.cumsum(~np.isnan(values), axis=1)[:, window_index]
+    today = values[:, :1]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        averages = np.round(window_sums / window_counts, decimal_places)
+        percentage_change = np.where(averages != 0, (today - averages) / averages * 100, np.nan)
+    too_short = available[:, None] < np.array(windows)[None, :]
+    averages[too_short] = np.nan
+    percentage_change[too_short] = np.nan
+
+    changes = []
+    for k, window in enumerate(windows):
+        block = keys.copy()
+        block['Window'] = window
+        block["Today's Data"] = today[:, 0]
+        block['Average'] = averages[:, k]
+        block['Percentage Change'] = percentage_change[:, k]
+        changes.append(block)
+    return pd.concat(changes, ignore_index=True)
+
+def change_metrics_wide(changes, sheet_name):
+    """One row per product with an average / percentage change column pair per window, for display."""
+    sheet_changes = changes[changes['Sheet'] == sheet_name]
+    first_window = sheet_changes['Window'].min()
+    result = sheet_changes[sheet_changes['Window'] == first_window][['Product Name', 'ASIN', "Today's Data"]]
+    result = result.reset_index(drop=True)
+    for window, block in sheet_changes.groupby('Window', sort=True):
+        result[f'{window}-Day Average'] = block['Average'].to_numpy()
+        result[f'Percentage Change ({window}-day avg)'] = block['Percentage Change'].to_numpy()
+    return result
 
-        return report_df
+def top_changes(changes, n=20, window=None):
+    """The n rows with the largest absolute Percentage Change, largest first, using partial selection."""
+    if window is not None:
+        changes = changes[changes['Window'] == window]
+    magnitude = np.nan_to_num(changes['Percentage Change'].abs().to_numpy(), nan=-1.0)
+    if n < len(changes):
+        selected = np.argpartition(-magnitude, n - 1)[:n]
     else:
-        raise ValueError("Input data must be a pandas DataFrame.")
-    
-
-
+        selected = np.arange(len(changes))
+    selected = selected[np.argsort(-magnitude[selected], kind='stable')]
+    return changes.iloc[selected]
 
+def calculate_averages_and_percentage_change(file_path, sheet_name, decimal_places=2):
+    """3-day and 5-day averages and percentage changes for one sheet (see calculate_change_metrics)."""
+    changes = calculate_change_metrics(file_path, [sheet_name], windows=(3, 5), decimal_places=decimal_places)
+    return change_metrics_wide(changes, sheet_name)
+    
 
-import pandas as pd
+@traced()
+def calculate_max_drr_with_push_drr(inventory_data, target_date, future_date, manual_drr=None, fractional=False):
+    """
+    Maximum sustainable DRR per product between the starting date and target_date.
 
-def calculate_averages_and_percentage_change(file_path, sheet_name, decimal_places=2):
-    # Load the data from the specified Excel sheet
-    data = pd.read_excel(file_path, sheet_name=sheet_name)
+    Solved in closed form for all products at once (see projection.max_sustainable_drr);
+    calculate_max_drr_with_push_drr_reference keeps the original day-by-day binary search.
+    Pass fractional=True for the exact DRR instead of the largest whole number.
+    """
+    df = inventory_data.copy()
 
-    # Ensure the data is a DataFrame
-    if isinstance(data, pd.DataFrame):
-        # List to store the results
-        results = []
-
-        # Loop through each product row starting from the second row (index 1)
-        for index, row in data.iterrows():
-            # The product name is now the second column (index 1) and ASIN is in the first column (index 0)
-            ASIN = row[0]
-            product_name = row[1]
-
-            # Extract the profit values (skipping the first two columns, ASIN and product name)
-            profit_data = row[2:]
-
-            # Ensure there are enough days of data to calculate the averages and percentage change
-            if len(profit_data) >= 5:
-                # Extract the last 5 days of data excluding today's and the previous day's data
-                last_five_days = profit_data.head(5)
-                today_profit = last_five_days.iloc[0]  # The second to last day's data (2-day lag)
-                last_three_days = profit_data.head(3)  # The first 3 days of the last 5 days excluding the lag
-
-                # Calculate the 3-day average (excluding today's and previous day's data)
-                three_day_avg = last_three_days.mean()
-                three_day_avg = round(three_day_avg, decimal_places)
-
-                # Calculate the 5-day average (excluding today's and previous day's data)
-                five_day_avg = last_five_days.mean()
-                five_day_avg = round(five_day_avg, decimal_places)
-
-                # Calculate the percentage change based on the 3-day average
-                if three_day_avg != 0:
-                    percentage_change_3_day = ((today_profit - three_day_avg) / three_day_avg) * 100
-                else:
-                    percentage_change_3_day = None
-
-                # Calculate the percentage change based on the 5-day average
-                if five_day_avg != 0:
-                    percentage_change_5_day = ((today_profit - five_day_avg) / five_day_avg) * 100
-                else:
-                    percentage_change_5_day = None
-            else:
-                three_day_avg = None
-                five_day_avg = None
-                percentage_change_3_day = None
-                percentage_change_5_day = None
-                today_profit = None
-
-            # Append the data as a row in the results list
-            results.append({
-                'Product Name': product_name,
-                'ASIN': ASIN,
-                'Today\'s Data': today_profit,
-                '3-Day Average': three_day_avg,
-                'Percentage Change (3-day avg)': percentage_change_3_day,
-                '5-Day Average': five_day_avg,
-
-                'Percentage Change (5-day avg)': percentage_change_5_day,
-
-            })
-
-        # Convert results list to a DataFrame
-        results_df = pd.DataFrame(results)
-        results_df.to_csv('unnatural changes in profit.csv')
-        return results_df
-    else:
-        raise ValueError("Input data must be a pandas DataFrame.")
-    
+    target_date = pd.to_datetime(target_date)
+    future_date = pd.to_datetime(future_date)
+    current_date = (datetime.now() - timedelta(days=2)).date()
+    calc_start_date = current_date if future_date.date() <= current_date else future_date.date()
 
-def calculate_normal_drr(merged_data, use_manual_drr=False, manual_drr_value=None):
-    df = merged_data.sort_values(['ASIN', 'Date'])
-    
-    if use_manual_drr and manual_drr_value is not None:
-        # Use the single manual DRR value for all ASINs
-        df['Daily_Run_Rate'] = manual_drr_value
-    else:
-        # Calculate DRR normally
-        df['Daily_Run_Rate'] = df.groupby('ASIN')['Sales'].transform(
-            lambda x: x.rolling(window=5, min_periods=1).mean()
-        )
-    
-    return df.round()
+    if df.empty:
+        return pd.DataFrame()
 
-def calculate_max_drr_with_push_drr(inventory_data, target_date, future_date, manual_drr=None):
+    # Shipment columns are the headers that parse as dates, processed in date order
+    shipments = []
+    for col in df.columns:
+        if isinstance(col, datetime) or (isinstance(col, str) and col not in ['ASIN', 'Product Name', 'Current inventory']):
+            try:
+                shipments.append((pd.to_datetime(col).date(), col))
+            except (ValueError, TypeError):
+                continue
+    shipments.sort(key=lambda x: x[0])
+    shipment_dates = [date for date, _ in shipments]
+    quantities = np.column_stack(
+        [pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=float) for _, col in shipments]
+    ) if shipments else np.empty((len(df), 0))
+    has_quantity = ~np.isnan(quantities)
+    before_future = np.array([date <= calc_start_date for date in shipment_dates], dtype=bool)
+    after_future = np.array([calc_start_date < date <= target_date.date() for date in shipment_dates], dtype=bool)
+
+    # Starting stock: current inventory, less the manual DRR up to the start, plus shipments already in
+    current_inventory = df['Current inventory'].to_numpy()
+    initial_inventory = current_inventory.astype(float)
+    if manual_drr is not None:
+        initial_inventory = initial_inventory - (calc_start_date - current_date).days * manual_drr
+    shipments_before_future = np.zeros(len(df))
+    shipments_after_future = np.zeros(len(df))
+    for j in range(len(shipments)):
+        arrived = np.nan_to_num(quantities[:, j])
+        if before_future[j]:
+            initial_inventory = initial_inventory + arrived
+            shipments_before_future = shipments_before_future + arrived
+        elif after_future[j]:
+            shipments_after_future = shipments_after_future + arrived
+
+    arrival_days = np.array([(date - calc_start_date).days for date in shipment_dates], dtype=np.int64)
+    horizon_days = (target_date.date() - calc_start_date).days + 1
+    max_drr = run_sharded(
+        max_sustainable_drr,
+        {'initial_inventory': initial_inventory, 'shipment_quantities': np.where(after_future, quantities, np.nan)},
+        arrival_days=arrival_days,
+        horizon_days=horizon_days,
+        integer=not fractional,
+        upper_bound=10000
+    )
+
+    # Whole-number columns stay integer where nothing fractional was added to them
+    added_before = (has_quantity & before_future).any(axis=1)
+    added_after = (has_quantity & after_future).any(axis=1)
+    integer_manual_drr = manual_drr is None or isinstance(manual_drr, (int, np.integer))
+    if integer_manual_drr and pd.api.types.is_integer_dtype(df['Current inventory']) and not added_before.any():
+        initial_inventory = initial_inventory.astype(np.int64)
+    if not added_before.any():
+        shipments_before_future = shipments_before_future.astype(np.int64)
+    if not added_after.any():
+        shipments_after_future = shipments_after_future.astype(np.int64)
+
+    return pd.DataFrame({
+        'Product Name': df['Product Name'].to_numpy(),
+        'ASIN': df['ASIN'].to_numpy() if 'ASIN' in df.columns else 'N/A',
+        'Current Inventory': initial_inventory,
+        'Max DRR': max_drr if fractional else max_drr.astype(np.int64),
+        'Total Shipments Before Future': shipments_before_future,
+        'Total Shipments After Future': shipments_after_future,
+    })
+
+def calculate_max_drr_with_push_drr_reference(inventory_data, target_date, future_date, manual_drr=None):
+    """Day-by-day binary search version of calculate_max_drr_with_push_drr, kept for cross-checking."""
     df = inventory_data.copy()
     
     # Validate dates
@@ -406,17 +469,23 @@ def calculate_max_drr_with_push_drr(inventory_data, target_date, future_date, ma
     
     return pd.DataFrame(results)
 
-def calculate_daily_drr(file_path, sheet_name, target_date):
+@traced()
+def calculate_daily_drr(file_path, sheet_name, target_date, phase_multipliers=config.DRR_PHASE_MULTIPLIERS, long_format=False):
+    """
+    Daily DRR plan per product from today to target_date.
+
+    The base DRR is the largest whole DRR the stock and upcoming shipments sustain up to
+    target_date; the horizon is split into equal phases scaled by phase_multipliers.
+    long_format=True returns Product Name / Date / DRR rows instead of one column per day.
+    """
     try:
-        df = pd.read_excel(file_path, sheet_name=sheet_name)
+        df = read_sheet(file_path, sheet_name)
     except Exception as e:
-        st.error(f"Error loading Excel file: {e}")
-        return pd.DataFrame()
+        raise ValueError(f"Error loading Excel file: {e}") from e
 
     required_cols = ['Product Name', 'Current inventory']
     if not all(col in df.columns for col in required_cols):
-        st.error("Missing required columns in the Excel sheet.")
-        return pd.DataFrame()
+        raise ValueError("Missing required columns in the Excel sheet.")
 
     df['Current inventory'] = pd.to_numeric(df['Current inventory'], errors='coerce').fillna(0).astype(int)
 
@@ -427,68 +496,52 @@ def calculate_daily_drr(file_path, sheet_name, target_date):
 
     try:
         target_date = pd.to_datetime(target_date)
-    except ValueError:
-        st.error("Invalid target date format.")
-        return pd.DataFrame()
-
-    date_range = pd.date_range(start=datetime.today(), end=target_date, freq='D')
-    results = {}
+    except ValueError as e:
+        raise ValueError("Invalid target date format.") from e
 
-    for _, row in df.iterrows():
-        product_name = row['Product Name']
-        initial_inventory = row['Current inventory']
-        shipments = [(date, int(pd.to_numeric(row[col], errors='coerce'))) for date, col in valid_shipments.items() if pd.notnull(row[col]) and row[col] > 0]
-        shipments.sort()
-
-        left, right = 0, max(initial_inventory + sum(qty for _, qty in shipments), 1000)
-        base_drr = 0
-
-        # Binary search for max sustainable DRR
-        while left <= right:
-            mid = (left + right) // 2
-            remaining = initial_inventory
-            current_date = datetime.today()
-            shipment_idx = 0
-            is_sustainable = True
-
-            while current_date <= target_date:
-                while shipment_idx < len(shipments) and shipments[shipment_idx][0] <= current_date:
-                    remaining += shipments[shipment_idx][1]
-                    shipment_idx += 1
-
-                remaining -= mid
-                if remaining < 0:
-                    is_sustainable = False
-                    break
-
-                current_date += timedelta(days=1)
-
-            if is_sustainable:
-                base_drr = mid
-                left = mid + 1
-            else:
-                right = mid - 1
-
-        # Adjust DRR for different periods
-        total_days = len(date_range)
-        period_length = total_days // 3
-        drr_data = {}
-
-        for i, date in enumerate(date_range):
-            if i < period_length:
-                multiplier = 0.9
-            elif i < 2 * period_length:
-                multiplier = 1.1
-            else:
-                multiplier = 1.3
-
-            drr_data[date.strftime('%Y-%m-%d')] = int(base_drr * multiplier)
-
-        results[product_name] = {'Current inventory': initial_inventory, **drr_data}
+    start_date = datetime.today()
+    date_range = pd.date_range(start=start_date, end=target_date, freq='D')
+    if df.empty:
+        return pd.DataFrame()
 
-    result_df = pd.DataFrame.from_dict(results, orient='index')
+    # Products x shipments matrix of whole positive quantities, plus the day each one lands
+    quantities = np.column_stack(
+        [pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=float) for col in valid_shipments.values()]
+    ) if valid_shipments else np.empty((len(df), 0))
+    quantities = np.where(quantities > 0, np.trunc(quantities), 0)
+    arrival_days = np.ceil((pd.DatetimeIndex(list(valid_shipments)) - start_date) / timedelta(days=1))
+    arrival_days = np.clip(np.asarray(arrival_days, dtype=float), 0, None).astype(np.int64)
+
+    initial_inventory = df['Current inventory'].to_numpy()
+    # Sharded inputs must be numeric; an object column (mixed cells) is coerced here
+    stock = np.asarray(initial_inventory, dtype=float)
+    base_drr = run_sharded(
+        max_sustainable_drr,
+        {'initial_inventory': stock, 'shipment_quantities': quantities,
+         'upper_bound': np.maximum(stock + quantities.sum(axis=1), 1000)},
+        arrival_days=arrival_days,
+        horizon_days=len(date_range)
+    ).astype(np.int64)
+
+    timeline = run_sharded(drr_timeline, {'base_drr': base_drr}, days=len(date_range),
+                           phase_multipliers=phase_multipliers)
+    result_df = pd.DataFrame(timeline, index=df['Product Name'].to_numpy(), columns=date_range.strftime('%Y-%m-%d'))
+    result_df.insert(0, 'Current inventory', initial_inventory)
+    if result_df.index.has_duplicates:
+        # Same product listed twice: the last row wins, at the position of the first
+        result_df = result_df[~result_df.index.duplicated(keep='last')].reindex(pd.unique(result_df.index))
+
+    if long_format:
+        return drr_timeline_long(result_df)
     return result_df
 
+def drr_timeline_long(timeline_df):
+    """Reshape a calculate_daily_drr result into Product Name / Date / DRR rows for charting."""
+    long_df = timeline_df.drop(columns='Current inventory').rename_axis('Product Name').reset_index().melt(
+        id_vars='Product Name', var_name='Date', value_name='DRR')
+    long_df['Date'] = pd.to_datetime(long_df['Date'], format='%Y-%m-%d')
+    return long_df
+
 # Update the main tabs section in your main() function:
 # def main():
     # ... (previous code remains the same until tabs creation)
@@ -505,14 +558,22 @@ def calculate_daily_drr(file_path, sheet_name, target_date):
     #     add_drr_timeline_tab()
 
 def read_us_products_data(uploaded_file, sheet_name="US Products"):
-    """Reads US Products sheet from Excel file and returns a DataFrame with ASIN, AWD, Backstock, and Upcoming Orders."""
+    """
+    Reads US Products sheet from Excel file and returns a DataFrame with ASIN, AWD, Backstock, and Upcoming Orders.
+    Workbooks without the sheet are valid and give an empty DataFrame. A sheet that cannot be read also
+    gives one, so the rest of the dashboard still loads, with the error in its attrs['error'] for the tab.
+    """
+    if not has_sheet(uploaded_file, sheet_name):
+        return pd.DataFrame()
     try:
-        df = pd.read_excel(uploaded_file, sheet_name=sheet_name)
+        df = read_sheet(uploaded_file, sheet_name)
         df = df[['ASIN','Product Name', 'AWD', 'Backstock', 'Upcoming Orders']].dropna()
         return df
     except Exception as e:
-        st.error(f"Error reading {sheet_name} sheet: {e}")
-        return pd.DataFrame()
+        logger.exception("Error reading %s sheet", sheet_name)
+        df = pd.DataFrame()
+        df.attrs['error'] = f"Error reading {sheet_name} sheet: {e}"
+        return df
     
 def calculate_us_shipment_plan(inventory_status, us_products_data, target_date):
     if target_date is None:
@@ -529,7 +590,9 @@ def calculate_us_shipment_plan(inventory_status, us_products_data, target_date):
     result['Expected_Usage'] = (result['Daily_Run_Rate'] * result['Days_To_Target']).round()
 
     # Merge inventory data with US Products AWD, Backstock, and Upcoming Order
-    result = result.merge(us_products_data, on='ASIN', how='left').fillna(0)
+    result = result.merge(us_products_data, on='ASIN', how='left')
+    us_columns = ['AWD', 'Backstock', 'Upcoming Orders']
+    result[us_columns] = result[us_columns].fillna(0)
     result['Product Name'] = result['Product Name_x']
 
     # Display all columns (including AWD, Backstock, and Upcoming Orders)
@@ -550,17 +613,20 @@ def calculate_us_shipment_plan(inventory_status, us_products_data, target_date):
     # Ensure Final Required Shipment is not negative
     # result['Final Required Shipment'] = result['Final Required Shipment'].apply(lambda x: max(x, 0))
   
-    result.to_csv('us_shipment_pla.csv', index=False)
+    write_artifact('us_shipment_plan', result)
     return result
+@traced()
 def process_label_planning(uploaded_file, inventory_status, target_date=None):
-    """Reads label data, merges with inventory data, and calculates label planning details."""
-    try:
-        # Read label data
-        label_data = pd.read_excel(uploaded_file, sheet_name='labels')
-        label_data = label_data[['ASIN', 'Product Name', 'IN Stocks', 'Packed', 'New Orders']].dropna()
-    except Exception as e:
-        st.error(f"Error reading labels sheet: {e}")
+    """
+    Reads label data, merges with inventory data, and calculates label planning details.
+    Returns an empty DataFrame when the workbook has no labels sheet; a labels sheet that
+    cannot be read raises.
+    """
+    if not has_sheet(uploaded_file, 'labels'):
         return pd.DataFrame()
+    # Read label data
+    label_data = read_sheet(uploaded_file, 'labels')
+    label_data = label_data[['ASIN', 'Product Name', 'IN Stocks', 'Packed', 'New Orders']].dropna()
     
     if target_date is None:
         target_date = datetime.now() + timedelta(days=30)
@@ -572,7 +638,9 @@ def process_label_planning(uploaded_file, inventory_status, target_date=None):
     result['Expected_Usage'] = (result['Daily_Run_Rate'] * result['Days_To_Target']).round()
     
     # Merge label data
-    result = result.merge(label_data, on='ASIN', how='left').fillna(0)
+    result = result.merge(label_data, on='ASIN', how='left')
+    label_columns = ['IN Stocks', 'Packed', 'New Orders']
+    result[label_columns] = result[label_columns].fillna(0)
     result['Product Name'] = result['Product Name_x']
     
     # Calculate required inventory
@@ -0,0 +1,131 @@
+import numpy as np
+import pandas as pd
+from .trace import traced
+
+CUBE_METRICS = {'Sales': 'sales', 'Gross Profit': 'profit'}
+ONE_DAY = pd.Timedelta(days=1)
+
+
+def _week_starts(day_dates):
+    """Monday of the week of each date."""
+    return day_dates - pd.to_timedelta(day_dates.weekday, unit='D')
+
+
+@traced()
+def build_overview_cube(merged_data, products, start_date):
+    """
+    Sales and Gross Profit of the compact merged frame summed per product and day.
+
+    Cells are (product code, Day) with the row count and the non-missing count of each
+    metric next to the sums, so totals, means, product counts and trends can be answered
+    for any ASIN/product/date selection without touching the long frame. Per-date,
+    per-product and per-(product, week) totals are kept for the unfiltered cases. Rows whose
+    (ASIN, Product Name) is not in products (a missing key) are left out, as groupby() would.
+    """
+    pair_codes = pd.MultiIndex.from_frame(products[['ASIN', 'Product Name']]).get_indexer(
+        pd.MultiIndex.from_arrays([merged_data['ASIN'].astype(object), merged_data['Product Name'].astype(object)]))
+    days = merged_data['Day'].to_numpy()
+    n_products = len(products)
+    n_days = int(days.max()) + 1 if len(days) else 0
+    matched = pair_codes >= 0
+    cell = (pair_codes * n_days + days)[matched]
+    size = n_products * n_days
+
+    cube = {
+        'products': products,
+        'dates': pd.DatetimeIndex(start_date + np.arange(n_days) * ONE_DAY),
+        'rows': np.bincount(cell, minlength=size).reshape(n_products, n_days),
+    }
+    for column, name in CUBE_METRICS.items():
+        values = merged_data[column].to_numpy(dtype=float)[matched]
+        present = ~np.isnan(values)
+        cube[name] = np.bincount(cell[present], weights=values[present], minlength=size).reshape(n_products, n_days)
+        cube[f'{name}_count'] = np.bincount(cell[present], minlength=size).reshape(n_products, n_days)
+
+    week_starts = _week_starts(cube['dates'])
+    weeks, cube['day_week'] = np.unique(week_starts, return_inverse=True)
+    cube['weeks'] = pd.DatetimeIndex(weeks)
+    cube['daily'] = {name: cube[name].sum(axis=0) for name in ['rows', *CUBE_METRICS.values()]}
+    cube['product'] = {name: cube[name].sum(axis=1) for name in ['rows', *CUBE_METRICS.values()]}
+    cube['weekly'] = {
+        name: np.add.reduceat(cube[name], np.flatnonzero(np.r_[True, np.diff(cube['day_week']) != 0]), axis=1)
+        if n_days else cube[name]
+        for name in ['rows', *CUBE_METRICS.values()]
+    }
+    return cube
+
+
+def _selection(cube, dates=None, asins=None, products=None):
+    """Product rows and day columns of a selection (None = everything)."""
+    rows = None
+    if asins or products:
+        mask = np.ones(len(cube['products']), dtype=bool)
+        if asins:
+            mask &= cube['products']['ASIN'].isin(asins).to_numpy()
+        if products:
+            mask &= cube['products']['Product Name'].isin(products).to_numpy()
+        rows = np.flatnonzero(mask)
+    days = None
+    if dates:
+        days = cube['dates'].get_indexer(pd.DatetimeIndex(pd.to_datetime(list(dates))).unique())
+        days = np.sort(days[days >= 0])
+    return rows, days
+
+
+def _cells(matrix, rows, days):
+    if rows is not None:
+        matrix = matrix[rows]
+    if days is not None:
+        matrix = matrix[:, days]
+    return matrix
+
+
+@traced()
+def query_overview_cube(cube, dates=None, asins=None, products=None, weekly=False):
+    """
+    Overview KPIs and trend for a selection, matching the same figures computed on the
+    filtered long frame.
+
+    Returns (metrics, trend): metrics holds Total Products (distinct ASINs with rows),
+    Total Sales, Average Sales and Total Profit; trend has Date, Sales and Gross Profit
+    for every day (or week start) with rows.
+    """
+    rows, days = _selection(cube, dates, asins, products)
+    if rows is None and days is None:
+        by_day = cube['daily']
+        row_counts = cube['product']['rows']
+        totals = {name: by_day[name].sum() for name in CUBE_METRICS.values()}
+        sales_count = cube['sales_count'].sum()
+    else:
+        cells = {name: _cells(cube[name], rows, days) for name in ['rows', 'sales_count', *CUBE_METRICS.values()]}
+        by_day = {name: cells[name].sum(axis=0) for name in ['rows', *CUBE_METRICS.values()]}
+        row_counts = cells['rows'].sum(axis=1)
+        totals = {name: by_day[name].sum() for name in CUBE_METRICS.values()}
+        sales_count = cells['sales_count'].sum()
+
+    selected_products = cube['products'] if rows is None else cube['products'].iloc[rows]
+    metrics = {
+        'Total Products': selected_products['ASIN'][row_counts > 0].nunique(),
+        'Total Sales': totals['sales'],
+        'Average Sales': totals['sales'] / sales_count if sales_count else np.nan,
+        'Total Profit': totals['profit'],
+    }
+
+    if weekly and days is None:
+        weekly_cells = {name: _cells(matrix, rows, None) for name, matrix in cube['weekly'].items()}
+        trend_dates, trend = cube['weeks'], {name: matrix.sum(axis=0) for name, matrix in weekly_cells.items()}
+    else:
+        day_dates = cube['dates'] if days is None else cube['dates'][days]
+        trend_dates, trend = day_dates, by_day
+        if weekly:
+            selected_weeks, week = np.unique(cube['day_week'][days], return_inverse=True)
+            trend_dates = cube['weeks'][selected_weeks]
+            trend = {name: np.bincount(week, weights=values) for name, values in by_day.items()}
+
+    present = np.asarray(trend['rows']) > 0
+    trend_df = pd.DataFrame({
+        'Date': trend_dates[present],
+        'Sales': np.asarray(trend['sales'])[present],
+        'Gross Profit': np.asarray(trend['profit'])[present],
+    })
+    return metrics, trend_df
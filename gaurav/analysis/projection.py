@@ -0,0 +1,169 @@
+import numpy as np
+from datetime import datetime
+from .shard import check_cancelled
+
+# Days of inventory left -> status; a value equal to a bound falls in that bucket
+INVENTORY_STATUS_BOUNDS = np.array([20, 60, 80, 100])
+INVENTORY_STATUS_LABELS = np.array([
+    'In AIR',
+    'Expected to be in air',
+    'Sea Shipment',
+    'Planned to send in Next Sea Shipment',
+    'Sufficient Inventory',
+])
+NO_SALES_STATUS = 'No Sales Data'
+ONE_DAY = np.timedelta64(1, 'D')
+
+
+def parse_shipment_dates(shipment_columns, date_format="%d-%m-%Y"):
+    """Parse the shipment column headers once into a datetime64[us] vector (column order is kept)."""
+    return np.array([datetime.strptime(col, date_format) for col in shipment_columns], dtype='datetime64[us]')
+
+
+def inventory_status_buckets(days_of_inventory):
+    """Map days of inventory to the dashboard status labels (20/60/80/100 day buckets)."""
+    days = np.asarray(days_of_inventory, dtype=float)
+    labels = INVENTORY_STATUS_LABELS[np.searchsorted(INVENTORY_STATUS_BOUNDS, np.nan_to_num(days), side='left')]
+    return np.where(np.isfinite(days), labels, NO_SALES_STATUS)
+
+
+def project_inventory(current_inventory, shipment_quantities, shipment_dates, daily_run_rate, start=None):
+    """
+    Project inventory forward for all products at once.
+
+    current_inventory: (products,) stock on hand.
+    shipment_quantities: (products, shipments) matrix, columns in the same order as shipment_dates.
+    shipment_dates: (shipments,) datetime64 vector, see parse_shipment_dates().
+    daily_run_rate: (products,) consumption per day; 0 means no projection.
+
+    Shipments dated up to `start` are added to the stock first. The remaining ones are
+    walked in column order, skipping any dated before the previous one, and consumption
+    is charged between arrivals until a product cannot reach its next shipment. The walk
+    is the same for every product, so only the products are vectorised and the float
+    operations happen in the same order as a row-by-row simulation.
+
+    Returns a dict of arrays: 'updated_inventory', 'oos_date' (NaT when the run rate is 0)
+    and 'steps' (shipments each product reached before running out).
+    """
+    if start is None:
+        start = datetime.today()
+    start = np.datetime64(start, 'us')
+    inventory = np.array(current_inventory, dtype=float)
+    quantities = np.asarray(shipment_quantities, dtype=float).reshape(len(inventory), -1)
+    dates = np.asarray(shipment_dates, dtype='datetime64[us]')
+    drr = np.asarray(daily_run_rate, dtype=float)
+
+    for j in np.flatnonzero(dates <= start):
+        inventory = inventory + quantities[:, j]
+
+    # Shipments the walk visits: those not dated before the previously visited one
+    visited = []
+    cursor = start
+    for j, shipment_date in enumerate(dates):
+        if shipment_date >= cursor:
+            visited.append(j)
+            cursor = shipment_date
+
+    n = len(inventory)
+    running = drr != 0
+    safe_drr = np.where(running, drr, 1.0)
+    days_survived = np.zeros(n)
+    position = np.full(n, start)
+    steps = np.zeros(n, dtype=int)
+    current = start
+    for j in visited:
+        check_cancelled()
+        days_to_next_shipment = (dates[j] - current) // ONE_DAY
+        inventory_needed = days_to_next_shipment * drr
+        short = running & (inventory < inventory_needed)
+        days_survived[short] = inventory[short] // safe_drr[short]
+        position[short] = current
+        running &= ~short
+        inventory[running] = inventory[running] - inventory_needed[running] + quantities[running, j]
+        steps[running] += 1
+        current = dates[j]
+
+    days_survived[running] = inventory[running] // safe_drr[running]
+    position[running] = current
+
+    oos_date = position + (days_survived.astype(np.int64) * ONE_DAY).astype('timedelta64[us]')
+    oos_date[drr == 0] = np.datetime64('NaT')
+    return {
+        'updated_inventory': inventory,
+        'oos_date': oos_date,
+        'steps': steps,
+    }
+
+
+def days_until(dates, today=None):
+    """Whole days from `today` to each date (floored like timedelta.days); NaT gives inf."""
+    if today is None:
+        today = datetime.today()
+    dates = np.asarray(dates, dtype='datetime64[us]')
+    days = ((dates - np.datetime64(today, 'us')) // ONE_DAY).astype(float)
+    days[np.isnat(dates)] = np.inf
+    return days
+
+
+def max_sustainable_drr(initial_inventory, shipment_quantities, arrival_days, horizon_days, integer=True, upper_bound=None):
+    """
+    Largest constant daily run rate that keeps stock at or above zero for horizon_days days.
+
+    initial_inventory: (products,) stock before the first day.
+    shipment_quantities: (products, shipments) matrix, NaN counts as nothing arriving.
+    arrival_days: (shipments,) day offset at which each shipment is added, before that
+        day's consumption (0 = first day).
+    horizon_days: number of days consumed.
+
+    Stock after day i is initial + arrived(i) - i * drr, and arrived() only grows at
+    shipment arrivals, so the answer is the minimum of (stock available) / (days elapsed)
+    taken on the day before each arrival and on the last day. integer=True returns the
+    largest whole DRR (what a day-by-day binary search over whole numbers finds);
+    results are clipped to [0, upper_bound] (a scalar or one bound per product).
+    """
+    inventory = np.asarray(initial_inventory, dtype=float)
+    quantities = np.nan_to_num(np.asarray(shipment_quantities, dtype=float).reshape(len(inventory), -1))
+    arrival_days = np.asarray(arrival_days, dtype=np.int64)
+    upper = np.inf if upper_bound is None else upper_bound
+
+    if horizon_days <= 0:
+        return np.broadcast_to(np.asarray(upper, dtype=float), inventory.shape).copy()
+
+    in_horizon = arrival_days < horizon_days
+    order = np.argsort(arrival_days[in_horizon], kind='stable')
+    arrival_days = arrival_days[in_horizon][order]
+    quantities = quantities[:, in_horizon][:, order]
+
+    # Stock available at each checkpoint: before every arrival day, then at the end of the horizon
+    arrived = np.cumsum(quantities, axis=1)
+    arrived_before = np.hstack([np.zeros((len(inventory), 1)), arrived])
+    checkpoint_stock = inventory[:, None] + arrived_before
+    checkpoint_days = np.append(arrival_days, horizon_days).astype(float)
+    checkpoints = checkpoint_days > 0
+    checkpoint_stock = checkpoint_stock[:, checkpoints]
+    checkpoint_days = checkpoint_days[checkpoints]
+
+    drr = (checkpoint_stock / checkpoint_days).min(axis=1)
+    if integer:
+        drr = np.floor(drr)
+        # Division rounding can land one above a boundary; step back where that overshoots
+        overshoot = (checkpoint_stock - checkpoint_days * drr[:, None] < 0).any(axis=1)
+        drr[overshoot] -= 1
+    return np.clip(drr, 0, upper)
+
+
+def drr_timeline(base_drr, days, phase_multipliers=(0.9, 1.1, 1.3)):
+    """
+    Expand a base DRR per product into a (products, days) matrix of whole daily DRRs.
+
+    The days are split into len(phase_multipliers) equal phases, the last one taking the
+    remainder; each phase applies its multiplier to the base DRR (truncated to int).
+    """
+    multipliers = np.asarray(phase_multipliers, dtype=float)
+    period_length = days // len(multipliers)
+    if period_length:
+        phase = np.minimum(np.arange(days) // period_length, len(multipliers) - 1)
+    else:
+        phase = np.full(days, len(multipliers) - 1)
+    base_drr = np.asarray(base_drr, dtype=float)
+    return (base_drr[:, None] * multipliers[phase][None, :]).astype(np.int64)
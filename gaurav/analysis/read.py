@@ -0,0 +1,268 @@
+import os
+import io
+import json
+import shutil
+import hashlib
+import tempfile
+import threading
+from datetime import datetime, date, time
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+import config
+from .store import store_get, store_put
+from .trace import traced
+
+# (path, mtime, size) -> SHA-256, so an unchanged file is not re-hashed on every call
+_FILE_HASHES = {}
+_SNAPSHOT_LOCK = threading.Lock()
+MANIFEST_FILE = "manifest.json"
+# Layout of the snapshot files; a snapshot written with another one is parsed again
+SNAPSHOT_FORMAT = 2
+
+# A workbook already stored in config.SNAPSHOT_DIR, named by its hash; accepted wherever a
+# workbook path or upload is, so background workers can read it without the original file
+WorkbookSnapshot = namedtuple('WorkbookSnapshot', ['sha256'])
+
+
+def _read_bytes(uploaded_file):
+    """Return the raw bytes of a Streamlit UploadedFile or any file-like object."""
+    if hasattr(uploaded_file, 'getvalue'):
+        return uploaded_file.getvalue()
+    uploaded_file.seek(0)
+    return uploaded_file.read()
+
+
+def workbook_sha256(uploaded_file):
+    """Return the SHA-256 hex digest of a workbook given as a path or file-like object."""
+    if isinstance(uploaded_file, WorkbookSnapshot):
+        return uploaded_file.sha256
+    if isinstance(uploaded_file, (str, os.PathLike)):
+        stat = os.stat(uploaded_file)
+        key = (os.path.abspath(uploaded_file), stat.st_mtime_ns, stat.st_size)
+        if key not in _FILE_HASHES:
+            digest = hashlib.sha256()
+            with open(uploaded_file, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(chunk)
+            _FILE_HASHES[key] = digest.hexdigest()
+        return _FILE_HASHES[key]
+    return hashlib.sha256(_read_bytes(uploaded_file)).hexdigest()
+
+
+def _encode_header(column):
+    # Parquet only accepts string column names, so keep the original header type in the manifest
+    if isinstance(column, datetime):
+        return ['datetime', column.isoformat()]
+    if isinstance(column, (int, np.integer)) and not isinstance(column, bool):
+        return ['int', int(column)]
+    if isinstance(column, (float, np.floating)):
+        return ['float', float(column)]
+    return ['str', str(column)]
+
+
+def _decode_header(kind, value):
+    if kind == 'datetime':
+        return datetime.fromisoformat(value)
+    if kind == 'int':
+        return int(value)
+    if kind == 'float':
+        return float(value)
+    return value
+
+
+# Type of a cell in a column mixing types -> parser of its text; see _encode_mixed()
+_CELL_PARSERS = {
+    'none': lambda text: None,
+    'NaT': lambda text: pd.NaT,
+    'str': str,
+    'bool': lambda text: text == 'True',
+    'int': int,
+    'float': float,
+    'Timestamp': pd.Timestamp,
+    'datetime': datetime.fromisoformat,
+    'date': date.fromisoformat,
+    'time': time.fromisoformat,
+}
+
+
+def _cell_type(value):
+    if value is None:
+        return 'none'
+    if value is pd.NaT:
+        return 'NaT'
+    if isinstance(value, (bool, np.bool_)):
+        return 'bool'
+    if isinstance(value, (int, np.integer)):
+        return 'int'
+    if isinstance(value, (float, np.floating)):
+        return 'float'
+    if isinstance(value, pd.Timestamp):
+        return 'Timestamp'
+    for cell_type in (datetime, date, time):
+        if isinstance(value, cell_type):
+            return cell_type.__name__
+    # Anything else comes back as its text
+    return 'str'
+
+
+def _cell_text(value, cell_type):
+    if cell_type in ('none', 'NaT'):
+        return None
+    if cell_type == 'float':
+        return repr(float(value))
+    if cell_type in ('Timestamp', 'datetime', 'date', 'time'):
+        return value.isoformat()
+    return str(value)
+
+
+def _encode_mixed(values):
+    """
+    Cells of a column mixing types (text and numbers, which Arrow cannot type) as text,
+    with per cell a code into the returned list of type names.
+    """
+    types = [_cell_type(value) for value in values]
+    names = sorted(set(types))
+    texts = [_cell_text(value, cell_type) for value, cell_type in zip(values, types)]
+    codes = np.array([names.index(cell_type) for cell_type in types], dtype=np.int8)
+    return np.array(texts, dtype=object), codes, names
+
+
+def _decode_mixed(texts, codes, names):
+    parsers = [_CELL_PARSERS[name] for name in names]
+    cells = np.empty(len(texts), dtype=object)
+    cells[:] = [parsers[code](text) for text, code in zip(texts, codes)]
+    return cells
+
+
+def _is_mixed(column):
+    return column.dtype == object and pd.api.types.infer_dtype(column, skipna=True) not in ('string', 'empty')
+
+
+def _prune_snapshots(keep_path):
+    """Delete all but the config.SNAPSHOT_KEEP most recently used snapshots, never keep_path."""
+    snapshots = []
+    for entry in os.scandir(config.SNAPSHOT_DIR):
+        if entry.is_dir() and not entry.name.startswith('.') and entry.path != keep_path:
+            try:
+                snapshots.append((entry.stat().st_mtime, entry.path))
+            except FileNotFoundError:
+                # Pruned by another process meanwhile
+                continue
+    snapshots.sort(reverse=True)
+    for _, path in snapshots[config.SNAPSHOT_KEEP - 1:]:
+        # A worker may still be reading it; its sheets live on in that process' store
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def _write_snapshot(sheets, sha256, snapshot_path):
+    """Store every parsed sheet as Parquet next to a manifest describing the headers and cell types."""
+    os.makedirs(config.SNAPSHOT_DIR, exist_ok=True)
+    tmp_path = tempfile.mkdtemp(dir=config.SNAPSHOT_DIR, prefix=".tmp-")
+    manifest = {'sha256': sha256, 'format': SNAPSHOT_FORMAT, 'sheets': []}
+    try:
+        for i, (sheet_name, df) in enumerate(sheets.items()):
+            stored = df.copy()
+            stored.columns = [f"c{j}" for j in range(len(df.columns))]
+            # Column position -> type names of a column stored as text plus a t<position> code column
+            mixed = {}
+            for j in range(len(df.columns)):
+                if _is_mixed(stored[f"c{j}"]):
+                    texts, codes, mixed[str(j)] = _encode_mixed(stored[f"c{j}"].to_numpy())
+                    stored[f"c{j}"] = texts
+                    stored[f"t{j}"] = codes
+            file_name = f"{i}.parquet"
+            stored.to_parquet(os.path.join(tmp_path, file_name), index=False)
+            manifest['sheets'].append({
+                'name': sheet_name,
+                'file': file_name,
+                'columns': [_encode_header(col) for col in df.columns],
+                'mixed': mixed,
+            })
+        with open(os.path.join(tmp_path, MANIFEST_FILE), 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, snapshot_path)
+    except OSError:
+        # Another session finished the same snapshot first
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        if _read_manifest(snapshot_path) is None:
+            raise
+    except Exception:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+
+
+def _read_manifest(snapshot_path):
+    """The manifest of a complete snapshot in the current SNAPSHOT_FORMAT, else None."""
+    try:
+        with open(os.path.join(snapshot_path, MANIFEST_FILE)) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return None
+    return manifest if manifest.get('format') == SNAPSHOT_FORMAT else None
+
+
+def _load_snapshot(snapshot_path):
+    manifest = _read_manifest(snapshot_path)
+    sheets = {}
+    for sheet in manifest['sheets']:
+        df = pd.read_parquet(os.path.join(snapshot_path, sheet['file']))
+        for j, names in sheet['mixed'].items():
+            df[f"c{j}"] = _decode_mixed(df[f"c{j}"].to_numpy(), df.pop(f"t{j}").to_numpy(), names)
+        df.columns = [_decode_header(kind, value) for kind, value in sheet['columns']]
+        sheets[sheet['name']] = df
+    # Marks the snapshot as recently used for _prune_snapshots()
+    os.utime(snapshot_path)
+    return sheets
+
+
+def snapshot_exists(sha256):
+    """Whether the workbook with this hash has been parsed into config.SNAPSHOT_DIR."""
+    return _read_manifest(os.path.join(config.SNAPSHOT_DIR, sha256)) is not None
+
+
+@traced()
+def load_workbook_snapshot(uploaded_file):
+    """
+    Return every sheet of the workbook as {sheet_name: DataFrame}.
+
+    The workbook is parsed with openpyxl only the first time a given content hash is
+    seen; afterwards the sheets come from the Parquet snapshot in config.SNAPSHOT_DIR,
+    or straight from the snapshot store (analysis/store.py) within the same process. The
+    returned frames are copy-on-write copies of the stored ones, so changing them leaves
+    other sessions' data alone.
+    """
+    sha256 = workbook_sha256(uploaded_file)
+    sheets = store_get(sha256, 'sheets')
+    if sheets is not None:
+        return sheets
+
+    with _SNAPSHOT_LOCK:
+        sheets = store_get(sha256, 'sheets')
+        if sheets is None:
+            snapshot_path = os.path.join(config.SNAPSHOT_DIR, sha256)
+            if isinstance(uploaded_file, WorkbookSnapshot) and not snapshot_exists(sha256):
+                raise FileNotFoundError(f"No stored snapshot for workbook {sha256}")
+            if _read_manifest(snapshot_path) is None:
+                # Left by an older format or an interrupted write
+                shutil.rmtree(snapshot_path, ignore_errors=True)
+                source = uploaded_file
+                if not isinstance(uploaded_file, (str, os.PathLike)):
+                    source = io.BytesIO(_read_bytes(uploaded_file))
+                _write_snapshot(pd.read_excel(source, sheet_name=None), sha256, snapshot_path)
+                _prune_snapshots(snapshot_path)
+            sheets = store_put(sha256, 'sheets', _load_snapshot(snapshot_path))
+    return sheets
+
+
+def has_sheet(uploaded_file, sheet_name):
+    """Whether the workbook has a sheet named sheet_name."""
+    return sheet_name in load_workbook_snapshot(uploaded_file)
+
+
+def read_sheet(uploaded_file, sheet_name):
+    """Drop-in replacement for pd.read_excel(uploaded_file, sheet_name=sheet_name) backed by the snapshot."""
+    sheets = load_workbook_snapshot(uploaded_file)
+    if sheet_name not in sheets:
+        raise ValueError(f"Worksheet named '{sheet_name}' not found")
+    return sheets[sheet_name].copy()
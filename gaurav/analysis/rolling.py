@@ -0,0 +1,163 @@
+import numpy as np
+import pandas as pd
+import config
+from .write import write_artifact
+from .trace import traced
+
+
+def _group_matrix(values, group_codes, positions, n_groups, length):
+    """Lay a long column out as (groups, positions) with NaN where a group has fewer rows."""
+    matrix = np.full((n_groups, length), np.nan)
+    matrix[group_codes, positions] = values
+    return matrix
+
+
+def _rolling_sums(matrix, window):
+    """Rolling sum and non-NaN count over the last `window` positions of each row."""
+    sums = np.cumsum(np.nan_to_num(matrix), axis=1)
+    counts = np.cumsum(~np.isnan(matrix), axis=1)
+    sums[:, window:] = sums[:, window:] - sums[:, :-window]
+    counts[:, window:] = counts[:, window:] - counts[:, :-window]
+    return sums, counts
+
+
+def _ewm(matrix, span, initial=None):
+    """
+    Exponentially weighted mean along each row, like ewm(span, adjust=False, ignore_na=True).
+    initial is the value each row continues from (NaN starts fresh).
+    """
+    alpha = 2.0 / (span + 1.0)
+    result = np.full(matrix.shape, np.nan)
+    current = np.full(matrix.shape[0], np.nan) if initial is None else np.array(initial, dtype=float)
+    for p in range(matrix.shape[1]):
+        value = matrix[:, p]
+        has_value = ~np.isnan(value)
+        current = np.where(has_value & np.isnan(current), value, current)
+        current = np.where(has_value, alpha * value + (1 - alpha) * current, current)
+        result[:, p] = current
+    return result
+
+
+def rolling_statistics(df, value_cols=('Sales', 'Gross Profit'), windows=config.ROLLING_WINDOWS,
+                       ewm_span=config.EWM_SPAN, trend_windows=config.TREND_WINDOWS, group_col='ASIN',
+                       ewm_initial=None):
+    """
+    Rolling mean/sum, EWM rate and trend per group for a long frame already sorted by group and date.
+
+    Windows count rows within each group (like groupby().rolling()), NaN values are skipped and
+    a window needs one value. Every statistic comes from one cumulative-sum pass over a
+    (groups, rows) matrix instead of a Python callback per group.
+
+    Returns a frame aligned with df with, for each value column: '<col> <w>d Mean',
+    '<col> <w>d Sum', '<col> EWM <span>d' and '<col> Trend %' (short vs long window mean).
+    ewm_initial optionally holds the EWM columns indexed by group, to continue an earlier run.
+    Rows without a group key get NaN statistics, like groupby() dropping NaN keys.
+    """
+    group_codes, groups = pd.factorize(df[group_col], sort=False)
+    keyed = group_codes >= 0
+    if not keyed.all():
+        stats = rolling_statistics(df[keyed], value_cols, windows, ewm_span, trend_windows, group_col, ewm_initial)
+        result = pd.DataFrame(np.nan, index=df.index, columns=stats.columns)
+        result.iloc[np.flatnonzero(keyed)] = stats.to_numpy()
+        return result
+    group_codes = group_codes.astype(np.int64)
+    group_start = np.r_[0, np.flatnonzero(np.diff(group_codes)) + 1]
+    positions = np.arange(len(df)) - np.repeat(group_start, np.diff(np.r_[group_start, len(df)]))
+    length = positions.max() + 1 if len(df) else 0
+    windows = sorted(set(windows) | set(trend_windows))
+
+    stats = {}
+    for col in value_cols:
+        matrix = _group_matrix(pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=float),
+                               group_codes, positions, len(groups), length)
+        means = {}
+        for window in windows:
+            sums, counts = _rolling_sums(matrix, window)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                mean = np.where(counts > 0, sums / counts, np.nan)
+            means[window] = mean
+            stats[f'{col} {window}d Mean'] = mean[group_codes, positions]
+            stats[f'{col} {window}d Sum'] = np.where(counts > 0, sums, np.nan)[group_codes, positions]
+        ewm_col = f'{col} EWM {ewm_span}d'
+        initial = None
+        if ewm_initial is not None:
+            initial = ewm_initial[ewm_col].reindex(groups).to_numpy(dtype=float)
+        stats[ewm_col] = _ewm(matrix, ewm_span, initial)[group_codes, positions]
+        short_window, long_window = trend_windows
+        with np.errstate(invalid='ignore', divide='ignore'):
+            trend = np.where(means[long_window] != 0, (means[short_window] / means[long_window] - 1) * 100, np.nan)
+        stats[f'{col} Trend %'] = trend[group_codes, positions]
+    return pd.DataFrame(stats, index=df.index)
+
+
+def rolling_statistic_columns(value_cols=('Sales', 'Gross Profit'), windows=config.ROLLING_WINDOWS,
+                              ewm_span=config.EWM_SPAN, trend_windows=config.TREND_WINDOWS):
+    """Names of the columns rolling_statistics() returns for the same arguments."""
+    windows = sorted(set(windows) | set(trend_windows))
+    columns = []
+    for col in value_cols:
+        for window in windows:
+            columns += [f'{col} {window}d Mean', f'{col} {window}d Sum']
+        columns += [f'{col} EWM {ewm_span}d', f'{col} Trend %']
+    return columns
+
+
+def target_drr_multiplier(asins):
+    """Target DRR uplift per ASIN: top products, mid-section products, everything else."""
+    tiers = {asin: config.MID_SECTION_DRR_MULTIPLIER for asin in config.MID_SECTION_PRODUCTS}
+    tiers.update({asin: config.TOP_DRR_MULTIPLIER for asin in config.TOP_PRODUCTS})
+    return pd.Series(asins).map(tiers).astype(float).fillna(config.DEFAULT_DRR_MULTIPLIER).to_numpy()
+
+
+def rolling_frame(merged_data):
+    """merged_data sorted by ASIN and Date with the unrounded rolling statistics appended."""
+    df = merged_data.sort_values(['ASIN', 'Date'])
+    return pd.concat([df, rolling_statistics(df)], axis=1)
+
+
+def extend_rolling_frame(frame, new_rows, value_cols=('Sales', 'Gross Profit'), ewm_span=config.EWM_SPAN):
+    """
+    Add rows for dates after everything in a rolling_frame() result.
+
+    Only the new rows get statistics: the windows reach back into the last rows of each
+    ASIN and the EWM continues from each ASIN's last value, so the result matches
+    rolling_frame() over the combined data.
+    """
+    history_rows = max(config.ROLLING_WINDOWS + config.TREND_WINDOWS) - 1
+    new_rows = new_rows.sort_values(['ASIN', 'Date'])
+    history = frame.groupby('ASIN', sort=False, observed=True).tail(history_rows)[new_rows.columns]
+    tail = pd.concat([history, new_rows]).sort_values(['ASIN', 'Date'], kind='stable')
+    stats = rolling_statistics(tail).loc[new_rows.index]
+
+    ewm_cols = [f'{col} EWM {ewm_span}d' for col in value_cols]
+    last_ewm = frame.groupby('ASIN', sort=False, observed=True).tail(1).set_index('ASIN')[ewm_cols]
+    stats[ewm_cols] = rolling_statistics(new_rows, ewm_initial=last_ewm)[ewm_cols]
+
+    added = pd.concat([new_rows, stats], axis=1)
+    return pd.concat([frame, added]).sort_values(['ASIN', 'Date'], kind='stable')
+
+
+def finish_drr(frame, use_manual_drr=False, manual_drr_value=None):
+    """Daily_Run_Rate and Target_DRR on top of a rolling_frame(), rounded like the other outputs."""
+    df = frame.copy()
+    if use_manual_drr and manual_drr_value is not None:
+        # Use the single manual DRR value for all ASINs
+        df['Daily_Run_Rate'] = manual_drr_value
+    else:
+        df['Daily_Run_Rate'] = df[f'Sales {config.DRR_WINDOW}d Mean']
+
+    df['Target_DRR'] = (df['Daily_Run_Rate'] * target_drr_multiplier(df['ASIN'])).round()
+    # The workbook columns and the DRR are rounded; the rolling statistics keep their precision
+    rounded = df.columns.difference(rolling_statistic_columns(), sort=False)
+    df[rounded] = df[rounded].round()
+    write_artifact('drr_data', df)
+    return df
+
+
+@traced()
+def calculate_normal_drr(merged_data, use_manual_drr=False, manual_drr_value=None):
+    """
+    Daily_Run_Rate (rolling mean of Sales over config.DRR_WINDOW rows per ASIN, or the manual
+    value for every ASIN), Target_DRR and the rolling statistics, rounded like the other outputs.
+    """
+    return finish_drr(rolling_frame(merged_data), use_manual_drr, manual_drr_value)
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+
+# Unit counts are whole numbers, exact in float32; money keeps float64 so cents do not drift
+UNIT_DTYPE = np.float32
+MONEY_DTYPE = np.float64
+DAY_DTYPE = np.int32
+ONE_DAY = pd.Timedelta(days=1)
+
+
+def product_dimension(df):
+    """
+    One row per (ASIN, Product Name) pair, sorted, indexed by an int32 product code.
+    Its values are the categories of the compact frames.
+    """
+    products = df[['ASIN', 'Product Name']].astype(object).drop_duplicates()
+    products = products.sort_values(['ASIN', 'Product Name'], ignore_index=True)
+    products.index = pd.RangeIndex(len(products), name='Product Code')
+    return products
+
+
+def product_dtypes(products):
+    """Categorical dtypes for the ASIN and Product Name columns, sorted like the text values."""
+    return {
+        'ASIN': pd.CategoricalDtype(products['ASIN'].unique()),
+        'Product Name': pd.CategoricalDtype(np.sort(products['Product Name'].unique())),
+    }
+
+
+def compact_daily_frame(merged_data, products, start_date):
+    """
+    merged_data with categorical ASIN and Product Name over the product dimension, an
+    int32 Day (days since start_date) next to Date, float32 Sales (units) and float64 Gross Profit.
+    """
+    dtypes = product_dtypes(products)
+    return pd.DataFrame({
+        'ASIN': merged_data['ASIN'].astype(dtypes['ASIN']),
+        'Product Name': merged_data['Product Name'].astype(dtypes['Product Name']),
+        'Date': merged_data['Date'],
+        'Day': ((merged_data['Date'] - start_date) // ONE_DAY).astype(DAY_DTYPE),
+        'Sales': merged_data['Sales'].astype(UNIT_DTYPE),
+        'Gross Profit': merged_data['Gross Profit'].astype(MONEY_DTYPE),
+    }, index=merged_data.index)
+
+
+def frame_memory(df):
+    """Deep memory use of a frame in bytes."""
+    return int(df.memory_usage(deep=True).sum())
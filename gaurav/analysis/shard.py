@@ -0,0 +1,211 @@
+import sys
+import time
+import threading
+import multiprocessing
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import config
+
+# Worker pool for sharded kernels, created on first use and rebuilt when the worker count changes
+_POOL = None
+_POOL_WORKERS = None
+_LOCK = threading.Lock()
+# Cancellation check of the job running on each thread, see cancellation()
+_CANCEL = threading.local()
+
+
+@contextmanager
+def cancellation(check):
+    """
+    Run the block with check as this thread's cancellation check: a picklable callable
+    that raises once the job is cancelled. Kernels call it through check_cancelled().
+    """
+    previous = getattr(_CANCEL, 'check', None)
+    _CANCEL.check = check
+    try:
+        yield
+    finally:
+        _CANCEL.check = previous
+
+
+def check_cancelled():
+    """Raise if the job running on this thread has been cancelled; a no-op outside jobs."""
+    check = getattr(_CANCEL, 'check', None)
+    if check is not None:
+        check()
+
+
+def _pool(workers):
+    global _POOL, _POOL_WORKERS
+    with _LOCK:
+        if _POOL is None or _POOL_WORKERS != workers:
+            if _POOL is not None:
+                _POOL.shutdown(wait=False, cancel_futures=True)
+            # Spawned, not forked: the server process runs threads that must not be copied
+            _POOL = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            _POOL_WORKERS = workers
+        return _POOL
+
+
+def _copy_result(result):
+    if isinstance(result, dict):
+        return {key: np.array(value) for key, value in result.items()}
+    if isinstance(result, tuple):
+        return tuple(np.array(value) for value in result)
+    return np.array(result)
+
+
+def _concatenate(parts):
+    first = parts[0]
+    if isinstance(first, dict):
+        return {key: np.concatenate([part[key] for part in parts]) for key in first}
+    if isinstance(first, tuple):
+        return tuple(np.concatenate(values) for values in zip(*parts))
+    return np.concatenate(parts)
+
+
+def _run_chunks(kernel, rows, kwargs):
+    """kernel over rows in SHARD_MIN_ROWS-row chunks, checking for cancellation between them."""
+    n_rows = len(next(iter(rows.values())))
+    if n_rows <= config.SHARD_MIN_ROWS:
+        check_cancelled()
+        return kernel(**rows, **kwargs)
+    parts = []
+    for start in range(0, n_rows, config.SHARD_MIN_ROWS):
+        check_cancelled()
+        chunk = {name: array[start:start + config.SHARD_MIN_ROWS] for name, array in rows.items()}
+        parts.append(kernel(**chunk, **kwargs))
+    return _concatenate(parts)
+
+
+def _run_shard(kernel, specs, start, stop, kwargs, check=None):
+    """Worker side: attach to the shared row arrays, run kernel on rows [start, stop)."""
+    blocks = [shared_memory.SharedMemory(name=block_name) for _, block_name, _, _ in specs]
+    try:
+        rows = {
+            name: np.ndarray(shape, dtype=dtype, buffer=block.buf)[start:stop]
+            for (name, _, shape, dtype), block in zip(specs, blocks)
+        }
+        # Copied out so nothing returned (or left alive) points into the blocks closed below
+        if check is None:
+            result = _copy_result(kernel(**rows, **kwargs))
+        else:
+            with cancellation(check):
+                result = _copy_result(_run_chunks(kernel, rows, kwargs))
+        del rows
+        return result
+    finally:
+        for block in blocks:
+            block.close()
+
+
+def run_sharded(kernel, rows, workers=None, **kwargs):
+    """
+    Drop-in for kernel(**rows, **kwargs) split over the product dimension.
+
+    rows: {argument: array} of per-product inputs, all with the products on the first axis;
+    they are copied once into shared memory and each worker process reads its own slice.
+    kwargs: arguments shared by every product (dates, horizons, scalars), pickled as usual.
+    The kernel must be a module-level function that returns an array, a tuple of arrays or
+    a dict of arrays with one row per product; the shards' results are concatenated in
+    product order, so the output matches the unsharded call.
+
+    Runs in the calling process when workers (default config.SHARD_WORKERS) is 1 or
+    there are fewer than 2 * config.SHARD_MIN_ROWS products. Inside a cancellable job
+    (see cancellation()) every shard runs in SHARD_MIN_ROWS-row chunks and checks for
+    cancellation between them, in the workers as well, so the kernels must not mix rows.
+    """
+    workers = config.SHARD_WORKERS if workers is None else workers
+    n_rows = len(next(iter(rows.values())))
+    shards = min(workers, n_rows // config.SHARD_MIN_ROWS)
+    check = getattr(_CANCEL, 'check', None)
+    if shards <= 1:
+        if check is None:
+            return kernel(**rows, **kwargs)
+        return _run_chunks(kernel, rows, kwargs)
+
+    blocks = []
+    specs = []
+    try:
+        for name, array in rows.items():
+            array = np.ascontiguousarray(array)
+            if array.dtype.hasobject:
+                raise TypeError(f"Sharded argument '{name}' must be numeric, not {array.dtype}")
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            blocks.append(block)
+            np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+            specs.append((name, block.name, array.shape, array.dtype.str))
+        bounds = np.linspace(0, n_rows, shards + 1).astype(int)
+        pool = _pool(workers)
+        futures = [pool.submit(_run_shard, kernel, specs, start, stop, kwargs, check)
+                   for start, stop in zip(bounds[:-1], bounds[1:])]
+        try:
+            return _concatenate([future.result() for future in futures])
+        except BaseException:
+            # A cancelled shard stops the others at their next chunk, or before they start
+            for future in futures:
+                future.cancel()
+            raise
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+
+def benchmark_scaling(n_products=20000, worker_counts=(1, 2, 4), shipments=12, days=90, repeats=3):
+    """
+    Time the sharded kernels on random data for each worker count.
+
+    Returns [(kernel name, workers, best seconds, speed-up over 1 worker)]. The first
+    call per worker count also starts the pool, so that warm-up run is not timed.
+    """
+    from datetime import datetime, timedelta
+    from .projection import project_inventory, max_sustainable_drr, drr_timeline
+    from .function import benchmark_rows
+
+    rng = np.random.default_rng(0)
+    inventory = rng.integers(0, 5000, n_products).astype(float)
+    quantities = rng.integers(0, 2000, (n_products, shipments)).astype(float)
+    run_rate = rng.integers(0, 80, n_products).astype(float)
+    start = datetime(2025, 1, 1)
+    shipment_dates = np.array([start + timedelta(days=7 * (j + 1)) for j in range(shipments)], dtype='datetime64[us]')
+    arrival_days = np.arange(1, shipments + 1) * 7
+    sales = rng.integers(0, 50, (n_products, days)).astype(float)
+    profits = sales * rng.uniform(-5, 20, (n_products, days))
+
+    cases = [
+        ('project_inventory', project_inventory,
+         {'current_inventory': inventory, 'shipment_quantities': quantities, 'daily_run_rate': run_rate},
+         {'shipment_dates': shipment_dates, 'start': start}),
+        ('max_sustainable_drr', max_sustainable_drr,
+         {'initial_inventory': inventory, 'shipment_quantities': quantities},
+         {'arrival_days': arrival_days, 'horizon_days': days, 'upper_bound': 10000}),
+        ('drr_timeline', drr_timeline, {'base_drr': run_rate}, {'days': days}),
+        ('benchmark_rows', benchmark_rows, {'sales': sales, 'profits': profits}, {'top_n': config.BENCHMARK_TOP_N}),
+    ]
+    results = []
+    for name, kernel, rows, kwargs in cases:
+        baseline = None
+        for workers in worker_counts:
+            run_sharded(kernel, rows, workers=workers, **kwargs)
+            timings = []
+            for _ in range(repeats):
+                started = time.perf_counter()
+                run_sharded(kernel, rows, workers=workers, **kwargs)
+                timings.append(time.perf_counter() - started)
+            best = min(timings)
+            baseline = baseline or best
+            results.append((name, workers, best, baseline / best))
+    return results
+
+
+if __name__ == '__main__':
+    # python -m analysis.shard [products] [worker counts...]
+    n_products = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    worker_counts = tuple(int(arg) for arg in sys.argv[2:]) or (1, 2, 4)
+    print(f"{n_products} products, {multiprocessing.cpu_count()} CPUs")
+    print(f"{'kernel':<22}{'workers':>8}{'seconds':>10}{'speed-up':>10}")
+    for name, workers, seconds, speedup in benchmark_scaling(n_products, worker_counts):
+        print(f"{name:<22}{workers:>8}{seconds:>10.3f}{speedup:>10.2f}")
@@ -0,0 +1,138 @@
+import threading
+import numpy as np
+import pandas as pd
+import config
+
+# Frames handed out by the store are shallow copies of the stored ones: with Copy-on-Write
+# a write to one copies the data it touches, so a session can never change another's.
+pd.set_option("mode.copy_on_write", True)
+
+# Workbook SHA-256 -> {kind: value}, least recently used first
+_VERSIONS = {}
+# Workbook SHA-256 -> {id of a frame or array: bytes} of what the version holds
+_SIZES = {}
+_EVICTIONS = {'count': 0}
+_LISTENERS = []
+_STORE_LOCK = threading.RLock()
+
+
+def _walk(value):
+    """Frames, series and arrays held by a stored value, looking inside dicts, lists and tuples."""
+    if isinstance(value, (pd.DataFrame, pd.Series, np.ndarray)):
+        yield value
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from _walk(item)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            yield from _walk(item)
+
+
+def _share(value):
+    """
+    What a session gets for a stored value: the same dicts, lists and tuples rebuilt around
+    shallow (copy-on-write) copies of its frames and series and read-only views of its arrays.
+    """
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return value.copy(deep=False)
+    if isinstance(value, np.ndarray):
+        view = value.view()
+        # Object (text) arrays stay writeable, pandas' Cython helpers reject read-only ones
+        view.flags.writeable = value.dtype.hasobject
+        return view
+    if isinstance(value, dict):
+        return {key: _share(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(_share(item) for item in value)
+    return value
+
+
+def _buffer(values):
+    # Address of the memory behind an array (or id of an extension array), the same for
+    # every shallow copy and view of it
+    if isinstance(values, np.ndarray):
+        return values.__array_interface__['data'][0]
+    return id(values)
+
+
+def _buffers(value):
+    """{memory behind the value: bytes} of a frame, series or array, column by column."""
+    if isinstance(value, np.ndarray):
+        return {_buffer(value): int(value.nbytes)}
+    columns = value.items() if isinstance(value, pd.DataFrame) else [(value.name, value)]
+    buffers = {id(value.index): int(value.index.memory_usage(deep=True))}
+    for _, column in columns:
+        # to_numpy() of a numpy dtype column is a view under Copy-on-Write; extension arrays
+        # (nullable, categorical, tz-aware) would be converted, so they count by identity
+        values = column.to_numpy() if isinstance(column.dtype, np.dtype) else column.array
+        buffers[_buffer(values)] = int(column.memory_usage(index=False, deep=True))
+    return buffers
+
+
+def _total_bytes():
+    # A column shared by several kinds or versions (sheets reused by an incremental ingest) counts once
+    sizes = {}
+    for version in _SIZES.values():
+        sizes.update(version)
+    return sum(sizes.values())
+
+
+def add_eviction_listener(listener):
+    """Call listener(sha256) whenever a workbook version is evicted, to drop what was derived from it."""
+    _LISTENERS.append(listener)
+
+
+def store_get(sha256, kind):
+    """
+    The value stored for a workbook version, or None; a hit makes the version most recently
+    used. Frames come as copy-on-write copies and arrays as read-only views (see _share).
+    """
+    with _STORE_LOCK:
+        version = _VERSIONS.get(sha256)
+        if version is None or kind not in version:
+            return None
+        _VERSIONS[sha256] = _VERSIONS.pop(sha256)
+        return _share(version[kind])
+
+
+def store_put(sha256, kind, value):
+    """
+    Keep value (sheets, an ingest result) for a workbook version, shared by every session
+    of this process without copying the data; the store owns value from then on. Least
+    recently used versions are then evicted until the store fits config.SNAPSHOT_MEMORY_BUDGET_MB,
+    though the version just stored is always kept. Returns what store_get() would.
+    """
+    with _STORE_LOCK:
+        version = _VERSIONS.pop(sha256, {})
+        version[kind] = value
+        _VERSIONS[sha256] = version
+        _SIZES[sha256] = {}
+        for item in _walk(version):
+            _SIZES[sha256].update(_buffers(item))
+
+        evicted = []
+        budget = config.SNAPSHOT_MEMORY_BUDGET_MB * 1024 * 1024
+        while len(_VERSIONS) > 1 and _total_bytes() > budget:
+            oldest = next(iter(_VERSIONS))
+            del _VERSIONS[oldest]
+            del _SIZES[oldest]
+            _EVICTIONS['count'] += 1
+            evicted.append(oldest)
+    for oldest in evicted:
+        for listener in _LISTENERS:
+            listener(oldest)
+    return _share(value)
+
+
+def store_footprint():
+    """Bytes held, the budget, evictions so far and per version (most recent last) its kinds and bytes."""
+    with _STORE_LOCK:
+        return {
+            'bytes': _total_bytes(),
+            'budget': config.SNAPSHOT_MEMORY_BUDGET_MB * 1024 * 1024,
+            'evictions': _EVICTIONS['count'],
+            'versions': [
+                {'sha256': sha256, 'kinds': sorted(kinds), 'bytes': sum(_SIZES[sha256].values())}
+                for sha256, kinds in _VERSIONS.items()
+            ],
+        }
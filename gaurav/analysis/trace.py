@@ -0,0 +1,149 @@
+import os
+import json
+import time
+import uuid
+import logging
+import logging.handlers
+import threading
+import multiprocessing
+import functools
+import collections
+from contextlib import contextmanager
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import config
+
+logger = logging.getLogger(__name__)
+
+# Finished reruns of this process, newest last, for the dashboard's performance panel
+_RUNS = collections.deque(maxlen=config.TRACE_KEEP_RUNS)
+_RUNS_LOCK = threading.Lock()
+# Per thread: the rerun being traced and the depth of the open spans
+_LOCAL = threading.local()
+_HANDLER = None
+_LOG_LOCK = threading.Lock()
+
+
+def _trace_handler():
+    # Watched: a process whose file was rotated away by another process reopens the new one
+    global _HANDLER
+    with _LOG_LOCK:
+        if _HANDLER is None:
+            os.makedirs(os.path.dirname(config.TRACE_LOG_PATH) or ".", exist_ok=True)
+            _HANDLER = logging.handlers.WatchedFileHandler(config.TRACE_LOG_PATH)
+            _HANDLER.setFormatter(logging.Formatter("%(message)s"))
+            trace_log = logging.getLogger(f"{__name__}.spans")
+            trace_log.setLevel(logging.INFO)
+            trace_log.propagate = False
+            trace_log.addHandler(_HANDLER)
+        return _HANDLER
+
+
+def _rotate(handler):
+    # Only main processes rotate; pool workers just append. One previous file is kept, so the
+    # log stays under twice the limit. The file is only moved if it is still the one written.
+    stream = handler.stream
+    if stream is None:
+        return
+    written = os.fstat(stream.fileno())
+    if written.st_size <= config.TRACE_LOG_MAX_MB * 1024 * 1024:
+        return
+    current = os.stat(config.TRACE_LOG_PATH)
+    if (current.st_dev, current.st_ino) == (written.st_dev, written.st_ino):
+        os.replace(config.TRACE_LOG_PATH, f"{config.TRACE_LOG_PATH}.1")
+
+
+def _emit(record):
+    """Append one JSON line to config.TRACE_LOG_PATH; every process appends to the same file."""
+    try:
+        handler = _trace_handler()
+        logging.getLogger(f"{__name__}.spans").info(json.dumps(record, default=str))
+        if multiprocessing.parent_process() is None:
+            with _LOG_LOCK:
+                _rotate(handler)
+    except OSError as e:
+        logger.warning("Could not write trace: %s", e)
+
+
+def result_rows(result):
+    """Rows of a frame, series, array or list result (the first frame of a tuple), else None."""
+    if isinstance(result, tuple):
+        result = next((item for item in result if isinstance(item, (pd.DataFrame, pd.Series, np.ndarray))), None)
+    if isinstance(result, (pd.DataFrame, pd.Series, np.ndarray, list)):
+        return len(result)
+    return None
+
+
+def start_trace_run(name, **fields):
+    """Start collecting the spans of a rerun in this thread; fields (user, ...) are kept with it."""
+    if not config.TRACE_ENABLED:
+        return
+    _LOCAL.run = dict(fields, run=name, run_id=uuid.uuid4().hex[:12], time=datetime.now().isoformat(timespec='milliseconds'),
+                      started=time.perf_counter(), pid=os.getpid(), spans=[])
+    _LOCAL.depth = 0
+
+
+def finish_trace_run():
+    """Close the rerun started in this thread, keep it for recent_trace_runs() and log its total."""
+    run = getattr(_LOCAL, 'run', None)
+    if run is None:
+        return None
+    _LOCAL.run = None
+    run['seconds'] = time.perf_counter() - run.pop('started')
+    with _RUNS_LOCK:
+        _RUNS.append(run)
+    _emit({key: value for key, value in run.items() if key != 'spans'})
+    return run
+
+
+def recent_trace_runs():
+    """Finished reruns of this process, oldest first, at most config.TRACE_KEEP_RUNS."""
+    with _RUNS_LOCK:
+        return list(_RUNS)
+
+
+@contextmanager
+def trace_span(stage, rows=None, cache=None):
+    """
+    Time the block as stage and log it as a JSON line with its duration, rows and cache
+    ('hit' or 'miss'); both can also be set on the yielded dict inside the block. Spans
+    opened inside the block are nested under it in the rerun's waterfall. A no-op when
+    config.TRACE_ENABLED is off.
+    """
+    record = {'stage': stage, 'rows': rows, 'cache': cache}
+    if not config.TRACE_ENABLED:
+        yield record
+        return
+    run = getattr(_LOCAL, 'run', None)
+    depth = getattr(_LOCAL, 'depth', 0)
+    _LOCAL.depth = depth + 1
+    started = time.perf_counter()
+    try:
+        yield record
+    except Exception as e:
+        record['error'] = type(e).__name__
+        raise
+    finally:
+        finished = time.perf_counter()
+        _LOCAL.depth = depth
+        record['seconds'] = finished - started
+        record['depth'] = depth
+        if run is not None:
+            record['start'] = started - run['started']
+            record['run_id'] = run['run_id']
+            run['spans'].append(record)
+        _emit(dict(record, pid=os.getpid()))
+
+
+def traced(stage=None):
+    """Decorator running the function in a trace_span named stage (default: the function name)."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with trace_span(stage or func.__name__) as record:
+                result = func(*args, **kwargs)
+                record['rows'] = result_rows(result)
+                return result
+        return wrapper
+    return decorate
@@ -0,0 +1,77 @@
+import os
+import queue
+import atexit
+import logging
+import threading
+from datetime import datetime
+import config
+
+logger = logging.getLogger(__name__)
+
+# One directory per process run, so concurrent servers never write the same file
+RUN_ID = f"{datetime.now():%Y%m%d-%H%M%S}-{os.getpid()}"
+# Artifact name -> latest frame waiting to be written; a newer write replaces a pending one
+_PENDING = {}
+_PENDING_LOCK = threading.Lock()
+_QUEUE = queue.Queue()
+_WORKER = None
+
+
+def artifact_dir():
+    """Directory the current run writes its artifacts to."""
+    return os.path.join(config.ARTIFACT_DIR, RUN_ID)
+
+
+def _write_artifact_file(name, df):
+    os.makedirs(artifact_dir(), exist_ok=True)
+    path = os.path.join(artifact_dir(), f"{name}.parquet")
+    tmp_path = f"{path}.tmp"
+    try:
+        df.to_parquet(tmp_path, compression=config.ARTIFACT_COMPRESSION)
+    except (TypeError, ValueError):
+        # Columns mixing text and numbers cannot be typed by Arrow; keep them as they are
+        path = os.path.join(artifact_dir(), f"{name}.pkl.gz")
+        df.to_pickle(tmp_path, compression='gzip')
+    os.replace(tmp_path, path)
+
+
+def _artifact_worker():
+    while True:
+        name = _QUEUE.get()
+        with _PENDING_LOCK:
+            df = _PENDING.pop(name, None)
+        try:
+            if df is not None:
+                _write_artifact_file(name, df)
+        except Exception:
+            logger.exception("Could not write artifact %s", name)
+        finally:
+            _QUEUE.task_done()
+
+
+def write_artifact(name, df):
+    """
+    Keep an intermediate frame for debugging as <ARTIFACT_DIR>/<run>/<name>.parquet.
+
+    Does nothing unless config.ARTIFACTS_ENABLED. The frame is copied and written by a
+    background thread, and a write still waiting in the queue is replaced by the newer
+    one, so callers never wait on disk.
+    """
+    global _WORKER
+    if not config.ARTIFACTS_ENABLED:
+        return
+    with _PENDING_LOCK:
+        queued = name in _PENDING
+        _PENDING[name] = df.copy()
+        if not queued:
+            _QUEUE.put(name)
+        if _WORKER is None:
+            _WORKER = threading.Thread(target=_artifact_worker, name="artifact-writer", daemon=True)
+            _WORKER.start()
+            atexit.register(flush_artifacts)
+
+
+def flush_artifacts():
+    """Block until every queued artifact has been written."""
+    if _WORKER is not None:
+        _QUEUE.join()
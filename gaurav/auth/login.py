@@ -7,41 +7,25 @@ import ui as gu_css
 import sqlite3
 import bcrypt
 import os
-import smtplib
-import ssl
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 import random
+import logging
+import config
+import data as data_func
+
+logger = logging.getLogger(__name__)
 
 # Define the path for the database inside the 'auth' folder
 db_path = os.path.join('auth', 'users.db')
 
 # Function to send email using Hostinger SMTP server
 def send_email_via_hostinger(receiver_email, subject, body):
-    smtp_server = "smtp.hostinger.com"  # Hostinger SMTP server
-    smtp_port = 587  # Port for TLS
-
-    sender_email = "info@shavgun.com"  # Your full email address
-    password = "Lapu971915@#"  # The password you set for the email account
-    # Create the email message
-    message = MIMEMultipart()
-    message["From"] = sender_email
-    message["To"] = receiver_email
-    message["Subject"] = subject
-    message.attach(MIMEText(body, "plain"))
-
-    # Set up SSL context
-    context = ssl.create_default_context()
-
-    try:
-        # Connect to the Hostinger SMTP server using TLS
-        with smtplib.SMTP(smtp_server, smtp_port) as server:
-            server.starttls(context=context)  # Start TLS encryption
-            server.login(sender_email, password)  # Login with your email credentials
-            server.sendmail(sender_email, receiver_email, message.as_string())  # Send email
-            print("Email sent successfully!")
-    except Exception as e:
-        print(f"An error occurred: {e}")
+    """Mail from the server's account (GU_SMTP_USER); returns the error text, or None once sent."""
+    # Connection, TLS, login and retries are handled by the shared mail sender
+    error = data_func.smtp_account_error() or data_func.send_mail(
+        config.SMTP_USER, config.SMTP_PASSWORD, receiver_email, subject, body)
+    if error is not None:
+        logger.error("Could not send '%s' to %s: %s", subject, receiver_email, error)
+    return error
         
         
 def create_auth_folder_and_db():
@@ -181,9 +165,12 @@ def check_password():
                     st.session_state.otp = otp
                     subject = "Your OTP Code"
                     body = f"Your OTP for login is: {otp}"
-                    send_email_via_hostinger(st.session_state.email, subject, body)
-                    st.session_state.otp_sent = True
-                    st.success("OTP sent to your email.")
+                    error = send_email_via_hostinger(st.session_state.email, subject, body)
+                    if error is None:
+                        st.session_state.otp_sent = True
+                        st.success("OTP sent to your email.")
+                    else:
+                        st.error(f"Could not send the OTP: {error}")
 
         # Step 3: Verify OTP
         if st.session_state.otp_sent:
@@ -63,7 +63,9 @@ def add_user(username, password, role, email='', full_name=''):
         Admin
         """
         if email:  # Ensure the email is provided
-            gu_auth.send_email_via_hostinger(email, subject, body)
+            error = gu_auth.send_email_via_hostinger(email, subject, body)
+            if error is not None:
+                return True, f"User added, but the notification could not be sent: {error}"
 
         return True, "User added successfully and notification sent."
     
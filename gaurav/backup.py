@@ -7,6 +7,7 @@ import config
 import analysis as analysis_func
 import auth as gu_auth
 import lang as gu_lang
+import components as gu_comp
 
 def main():
     if not gu_auth.login.check_password():
@@ -456,7 +457,7 @@ def main():
         with tabs[10]:
                 st.title("📊 Sales & Profit Analysis Tool")
                 st.write(gu_lang.LangConfig.get("UPLOAD_FILE_SALE_PROFIT_TEXT"))
-                analysis_func.function.Performance_Tracker(uploaded_file)
+                gu_comp.Performance_Tracker(uploaded_file)
         if gu_auth.login.has_permission('read'):
              st.title(config.DASHBOARD_TITLE)
     else:
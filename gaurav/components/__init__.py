@@ -1,2 +1,4 @@
 from .tabs import *  # Import everything from functions.py
 from .gu_cache import *  # Import everything from functions.py
+from .charts import *  # Import everything from functions.py
+from .table import *  # Import everything from functions.py
\ No newline at end of file
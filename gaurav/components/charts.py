@@ -0,0 +1,118 @@
+import json
+import threading
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+import config
+import analysis as analysis_func
+from .gu_cache import frame_fingerprint
+
+# (chart kind, data fingerprint, parameters) -> figure JSON, oldest first
+_FIGURES = {}
+_FIGURE_LOCK = threading.Lock()
+
+
+def downsample_minmax(df, x, y, max_points=config.CHART_MAX_POINTS):
+    """
+    At most max_points rows of a series ordered by x: the rows are split into equal
+    buckets and each bucket keeps its smallest and largest y, so peaks and dips survive.
+    """
+    if len(df) <= max_points:
+        return df
+    df = df.sort_values(x, kind='stable')
+    n_buckets = max(max_points // 2, 1)
+    bucket = np.arange(len(df)) * n_buckets // len(df)
+    values = df[y].to_numpy(dtype=float)
+    # Missing values are never a bucket's min or max
+    candidates = np.flatnonzero(~np.isnan(values))
+    if not len(candidates):
+        return df.iloc[:0]
+    order = candidates[np.lexsort((values[candidates], bucket[candidates]))]
+    starts = np.flatnonzero(np.r_[True, np.diff(bucket[order]) != 0])
+    ends = np.r_[starts[1:], len(order)] - 1
+    keep = np.unique(np.r_[order[starts], order[ends]])
+    return df.iloc[keep]
+
+
+def top_n_with_other(df, label, value, n=config.CHART_TOP_N, other_label="Other"):
+    """The n rows with the largest value and one more row summing the rest under other_label."""
+    if len(df) <= n + 1:
+        return df[[label, value]]
+    ranked = df[[label, value]].sort_values(value, ascending=False, kind='stable')
+    other = pd.DataFrame({label: [other_label], value: [ranked[value].iloc[n:].sum()]})
+    return pd.concat([ranked.iloc[:n], other], ignore_index=True)
+
+
+def cached_figure(kind, df, params, build):
+    """
+    Figure for df as a plotly JSON dict, built by build(df) only the first time a frame
+    with the same fingerprint is plotted with the same parameters.
+    """
+    with analysis_func.trace_span(f"figure: {kind}", rows=len(df)) as span:
+        key = (kind, frame_fingerprint(df), params)
+        with _FIGURE_LOCK:
+            figure_json = _FIGURES.pop(key, None)
+            if figure_json is not None:
+                _FIGURES[key] = figure_json
+        span['cache'] = 'miss' if figure_json is None else 'hit'
+        if figure_json is None:
+            figure_json = build(df).to_json()
+            with _FIGURE_LOCK:
+                _FIGURES[key] = figure_json
+                while len(_FIGURES) > config.FIGURE_CACHE_ENTRIES:
+                    _FIGURES.pop(next(iter(_FIGURES)))
+        return json.loads(figure_json)
+
+
+def line_chart(df, x, y, title, max_points=config.CHART_MAX_POINTS):
+    """Time series line, min/max downsampled to max_points."""
+    return cached_figure('line', df, (x, y, title, max_points),
+                         lambda df: px.line(downsample_minmax(df, x, y, max_points), x=x, y=y, title=title))
+
+
+def time_bar_chart(df, x, y, title, max_points=config.CHART_MAX_POINTS):
+    """Bar per date, min/max downsampled to max_points bars."""
+    return cached_figure('time_bar', df, (x, y, title, max_points),
+                         lambda df: px.bar(downsample_minmax(df, x, y, max_points), x=x, y=y, title=title))
+
+
+def top_n_bar_chart(df, label, value, title, n=config.CHART_TOP_N):
+    """Bar per product for the n largest values plus an "Other" bar for the rest."""
+    def build(df):
+        fig = px.bar(top_n_with_other(df, label, value, n), x=label, y=value, title=title)
+        fig.update_layout(xaxis_tickangle=-45)
+        return fig
+    return cached_figure('top_n_bar', df, (label, value, title, n), build)
+
+
+def scatter_chart(df, x, y, hover_data, title):
+    return cached_figure('scatter', df, (x, y, tuple(hover_data), title),
+                         lambda df: px.scatter(df, x=x, y=y, hover_data=hover_data, title=title))
+
+
+def trace_waterfall_chart(run):
+    """Waterfall of a traced rerun: a bar per span from its start, nested spans indented, cache hits green."""
+    spans = sorted(run['spans'], key=lambda span: span['start'])
+    positions = list(range(len(spans)))
+    colors = {'hit': '#2ca02c', 'miss': '#ff7f0e'}
+    fig = go.Figure(go.Bar(
+        y=positions,
+        x=[span['seconds'] * 1e3 for span in spans],
+        base=[span['start'] * 1e3 for span in spans],
+        orientation='h',
+        marker_color=[colors.get(span['cache'], '#1f77b4') for span in spans],
+        hovertext=[f"{span['stage']}: {span['seconds'] * 1e3:,.1f} ms, rows {span['rows']}, cache {span['cache']}"
+                   for span in spans],
+        hoverinfo='text',
+    ))
+    fig.update_layout(
+        title=f"{run['seconds'] * 1e3:,.0f} ms",
+        xaxis_title="ms since the rerun started",
+        yaxis=dict(tickvals=positions, ticktext=[". " * span['depth'] + span['stage'] for span in spans],
+                   autorange='reversed'),
+        height=120 + 18 * len(spans),
+        margin=dict(l=10, r=10, t=40, b=10),
+        showlegend=False,
+    )
+    return fig
@@ -1,37 +1,146 @@
-import streamlit as st
+import time
+import weakref
+import threading
+import functools
+import pandas as pd
+import config
 import analysis as analysis_func
+import data as data_func
 
-@st.cache_data
+# (function name, fingerprint of the arguments) -> result, oldest first
+_CACHE = {}
+# id(frame) -> (weak reference, fingerprint) for frames returned by a cached function
+_FINGERPRINTS = {}
+_CACHE_LOCK = threading.Lock()
+CACHE_STATS = {'hits': 0, 'misses': 0, 'hash_seconds': 0.0, 'last_hash_seconds': 0.0}
+
+
+def _forget_frame(ref, frame_id):
+    entry = _FINGERPRINTS.get(frame_id)
+    if entry is not None and entry[0] is ref:
+        del _FINGERPRINTS[frame_id]
+
+
+def frame_fingerprint(df):
+    """
+    Cheap identity of a frame: the key of the cached call that returned it, or a content
+    hash for frames built elsewhere (filtered copies and the like).
+    """
+    entry = _FINGERPRINTS.get(id(df))
+    if entry is not None and entry[0]() is df:
+        return entry[1]
+    return ('content', tuple(map(str, df.columns)), int(pd.util.hash_pandas_object(df).sum()))
+
+
+def _fingerprint(value):
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return frame_fingerprint(value)
+    if isinstance(value, (list, tuple)):
+        return tuple(_fingerprint(v) for v in value)
+    return value
+
+
+def _register_frames(result, key):
+    frames = result if isinstance(result, tuple) else (result,)
+    for i, frame in enumerate(frames):
+        if isinstance(frame, (pd.DataFrame, pd.Series)):
+            frame_id = id(frame)
+            ref = weakref.ref(frame, lambda ref, frame_id=frame_id: _forget_frame(ref, frame_id))
+            _FINGERPRINTS[frame_id] = (ref, key + (i,))
+
+
+def fingerprint_cache(func):
+    """
+    Process-wide cache keyed by argument fingerprints instead of argument contents.
+
+    Scalars are used as they are; frames returned by another cached function are
+    identified by that call's key (workbook hash, manual DRR, ...), so nothing is hashed
+    or copied on a warm rerun. Results are shared between sessions and must not be
+    modified in place.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with analysis_func.trace_span(func.__name__) as span:
+            start = time.perf_counter()
+            key = (func.__name__, _fingerprint(args), _fingerprint(tuple(sorted(kwargs.items()))))
+            elapsed = time.perf_counter() - start
+            with _CACHE_LOCK:
+                CACHE_STATS['hash_seconds'] += elapsed
+                CACHE_STATS['last_hash_seconds'] = elapsed
+                if key in _CACHE:
+                    CACHE_STATS['hits'] += 1
+                    _CACHE[key] = _CACHE.pop(key)
+                    span['cache'] = 'hit'
+                    span['rows'] = analysis_func.result_rows(_CACHE[key])
+                    return _CACHE[key]
+                CACHE_STATS['misses'] += 1
+
+            span['cache'] = 'miss'
+            result = func(*args, **kwargs)
+            span['rows'] = analysis_func.result_rows(result)
+            with _CACHE_LOCK:
+                _register_frames(result, key)
+                _CACHE[key] = result
+                while len(_CACHE) > config.CACHE_MAX_ENTRIES:
+                    _CACHE.pop(next(iter(_CACHE)))
+            return result
+    return wrapper
+
+
+def _mentions(key, sha256):
+    if isinstance(key, tuple):
+        return any(_mentions(part, sha256) for part in key)
+    return key == sha256
+
+
+def forget_workbook(sha256):
+    """Drop cached results computed from a workbook version the snapshot store has evicted."""
+    with _CACHE_LOCK:
+        for key in [key for key in _CACHE if _mentions(key, sha256)]:
+            del _CACHE[key]
+
+
+analysis_func.add_eviction_listener(forget_workbook)
+
+
+def cache_stats():
+    """Hit/miss counts, time spent building keys and the number of cached results."""
+    with _CACHE_LOCK:
+        return dict(CACHE_STATS, entries=len(_CACHE))
+
+@fingerprint_cache
 def setup_global_filters_selected_dates(merged_data):
     date_options = sorted(merged_data['Date'].unique())
     return date_options
 
-@st.cache_data
+@fingerprint_cache
 def setup_global_filters_asin_options(merged_data):
     asin_options = sorted(merged_data['ASIN'].unique())
     return asin_options
 
-@st.cache_data
+@fingerprint_cache
 def setup_global_filters_product_options(merged_data):
     product_options = sorted(merged_data['Product Name'].unique())
     
     return product_options
 
-@st.cache_data
-def load_all_data_first_part(uploaded_file):
-    sales_data = analysis_func.read_sales_data(uploaded_file, "Sales")
-    profit_data = analysis_func.read_gross_profit(uploaded_file, "Profit")
-    merged_data = analysis_func.merge_sales_and_profit(sales_data, profit_data)
-    inventory_data = analysis_func.read_inventory_data(uploaded_file, "Inventory")
-    us_products_data = analysis_func.calculate.read_us_products_data(uploaded_file, "US Products")
-    return merged_data, inventory_data, us_products_data
-
-@st.cache_data
-def load_all_data_second_part(merged_data, use_manual_drr, manual_drr_value, inventory_data):
-    drr_data = analysis_func.calculate.calculate_normal_drr(merged_data, use_manual_drr, manual_drr_value)
+@fingerprint_cache
+def load_all_data_first_part(uploaded_file, workbook_hash):
+    # workbook_hash keys the cache on the file content, the path stays the same across uploads
+    ingest = data_func.ingest_workbook(uploaded_file)
+    return ingest['merged'], ingest['inventory'], ingest['us_products']
+
+@fingerprint_cache
+def load_overview_cube(uploaded_file, workbook_hash):
+    return data_func.ingest_workbook(uploaded_file)['cube']
+
+@fingerprint_cache
+def load_all_data_second_part(merged_data, use_manual_drr, manual_drr_value, inventory_data, workbook_hash=None):
+    drr_data = data_func.workbook_drr(workbook_hash, merged_data, use_manual_drr, manual_drr_value)
     inventory_status = analysis_func.shipment_inventory_status(inventory_data, drr_data)
     return inventory_status
-@st.cache_data
+
+@fingerprint_cache
 def labal_data_calculation(uploaded_file, inventory_status, target_date):
     label_plan = analysis_func.calculate.process_label_planning(uploaded_file, inventory_status, target_date)
     return label_plan
\ No newline at end of file
@@ -0,0 +1,92 @@
+import threading
+import numpy as np
+import pandas as pd
+import config
+from .gu_cache import frame_fingerprint
+
+# (kind, data fingerprint, parameters) -> row positions or CSV bytes, oldest first
+_VIEWS = {}
+_VIEW_LOCK = threading.Lock()
+
+
+def _cached_view(key, compute):
+    with _VIEW_LOCK:
+        value = _VIEWS.pop(key, None)
+        if value is not None:
+            _VIEWS[key] = value
+            return value
+    value = compute()
+    with _VIEW_LOCK:
+        _VIEWS[key] = value
+        while len(_VIEWS) > config.TABLE_VIEW_CACHE_ENTRIES:
+            _VIEWS.pop(next(iter(_VIEWS)))
+    return value
+
+
+def _search_mask(df, columns, text):
+    """
+    Rows where any of the text or date columns contains text, ignoring case; each
+    distinct value is tested once. Numeric columns are not searched.
+    """
+    text = text.lower()
+    mask = np.zeros(len(df), dtype=bool)
+    for col in columns:
+        if pd.api.types.is_numeric_dtype(df[col]) or pd.api.types.is_bool_dtype(df[col]):
+            continue
+        codes, uniques = pd.factorize(df[col])
+        hits = np.flatnonzero(pd.Index(uniques).astype(str).str.lower().str.contains(text, regex=False))
+        if len(hits):
+            mask |= np.isin(codes, hits)
+    return mask
+
+
+def _sorted_positions(values, positions, ascending):
+    values = values.iloc[positions].reset_index(drop=True)
+    try:
+        order = values.sort_values(ascending=ascending, kind='stable', na_position='last').index
+    except TypeError:
+        # Columns mixing text and numbers are ordered by their text
+        order = values.astype(str).sort_values(ascending=ascending, kind='stable').index
+    return positions[order.to_numpy()]
+
+
+def table_view(df, columns, search="", sort_by=None, ascending=True):
+    """
+    Row positions of df whose columns contain search, ordered by sort_by (stable, missing
+    values last). Cached per frame fingerprint, so paging through a view does not search
+    or sort again.
+    """
+    search = search.strip()
+    columns = tuple(columns)
+
+    def compute():
+        positions = np.arange(len(df))
+        if search:
+            positions = np.flatnonzero(_search_mask(df, columns, search))
+        if sort_by is not None:
+            positions = _sorted_positions(df[sort_by], positions, ascending)
+        return positions
+
+    if not search and sort_by is None:
+        return np.arange(len(df))
+    return _cached_view(('view', frame_fingerprint(df), columns, search, sort_by, ascending), compute)
+
+
+def table_page(df, positions, page, page_size=config.TABLE_PAGE_SIZE, columns=None, formatter=None):
+    """Rows of page (1-based) of a view, projected to columns and passed through formatter."""
+    start = (page - 1) * page_size
+    rows = df.iloc[positions[start:start + page_size]]
+    if columns is not None:
+        rows = rows[list(columns)]
+    return formatter(rows) if formatter is not None else rows
+
+
+def table_csv(df, positions, formatter=None):
+    """All rows of a view with every column as CSV bytes, built once per view."""
+    def compute():
+        rows = df.iloc[positions]
+        if formatter is not None:
+            rows = formatter(rows)
+        return rows.to_csv(index=False).encode('utf-8')
+    return _cached_view(('csv', frame_fingerprint(df), len(positions), hash(positions.tobytes()),
+                         formatter), compute)
@@ -1,5 +1,8 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
+import io
+import time
 from datetime import datetime, timedelta
 import plotly.express as px
 import tempfile
@@ -9,6 +12,7 @@ import auth as gu_auth
 import lang as gu_lang
 import os
 import components as gu_comp
+import data as data_func
 
 
 def handle_file_operations():
@@ -26,10 +30,10 @@ def handle_file_operations():
 
         if uploaded_file:
             try:
-                # Save uploaded file temporarily for processing
-                with open(file_path, "wb") as f:
-                    f.write(uploaded_file.getvalue())
-                st.sidebar.success("File updated successfully!")
+                # Written only when the content differs from the saved file
+                _, changed = data_func.save_upload(uploaded_file, file_path, st.session_state.get("current_user"))
+                if changed:
+                    st.sidebar.success("File updated successfully!")
             except Exception as e:
                 st.error("Error saving the uploaded file")
                 st.exception(e)
@@ -44,9 +48,7 @@ def handle_file_operations():
         uploaded_file = st.sidebar.file_uploader("Upload Excel File", type=['xlsx'], key="file_uploader")
         if uploaded_file:
             try:
-                # Save uploaded file temporarily for processing
-                with open(file_path, "wb") as f:
-                    f.write(uploaded_file.getvalue())
+                data_func.save_upload(uploaded_file, file_path, st.session_state.get("current_user"))
                 st.sidebar.success("File uploaded and saved successfully!")
             except Exception as e:
                 st.error("Error saving the uploaded file")
@@ -65,13 +67,19 @@ def delete_saved_file(file_path):
         st.sidebar.warning("No file found to delete.")
         
 def load_all_data_first(uploaded_file):
-    merged_data, inventory_data, us_products_data = gu_comp.load_all_data_first_part(uploaded_file)
+    workbook_hash = analysis_func.workbook_sha256(uploaded_file)
+    if not analysis_func.snapshot_exists(workbook_hash):
+        # Parse a new workbook in the compute pool; if that fails the ingest below parses it and reports the error
+        wait_for_job("workbook_snapshot", workbook_hash, {'path': uploaded_file}, "Reading workbook",
+                     job_id=data_func.rebuild_snapshot(uploaded_file, workbook_hash))
+    merged_data, inventory_data, us_products_data = gu_comp.load_all_data_first_part(uploaded_file, workbook_hash)
     st.sidebar.header(gu_lang.LangConfig.get("DRR_SETTINGS"))
     use_manual_drr = st.sidebar.checkbox(gu_lang.LangConfig.get("USE_MANUAL_DRR"), value=False)
     manual_drr_value = None
     if use_manual_drr:
         manual_drr_value = st.sidebar.number_input(gu_lang.LangConfig.get("MANUAL_DRR_VALUE"), min_value=0.0, value=100.0, step=0.1)
-    inventory_status = gu_comp.load_all_data_second_part(merged_data, use_manual_drr, manual_drr_value, inventory_data)
+    inventory_status = gu_comp.load_all_data_second_part(merged_data, use_manual_drr, manual_drr_value, inventory_data, workbook_hash)
+    st.session_state.workbook_key = (workbook_hash, use_manual_drr, manual_drr_value)
     return merged_data, inventory_data, us_products_data, inventory_status
 
 def setup_global_filters(merged_data):
@@ -95,48 +103,183 @@ def setup_global_filters(merged_data):
 
     return selected_dates, selected_asins, selected_products
 
-def display_overview_tab(filtered_merged_data):
+def display_cache_stats():
+    stats = gu_comp.cache_stats()
+    with st.sidebar.expander("Cache statistics"):
+        st.write(f"Hits: {stats['hits']}  Misses: {stats['misses']}  Entries: {stats['entries']}")
+        st.write(f"Key hashing: {stats['last_hash_seconds'] * 1e6:,.0f} µs last call, {stats['hash_seconds'] * 1e3:,.1f} ms total")
+        footprint = analysis_func.store_footprint()
+        st.write(f"Snapshot store: {footprint['bytes'] / 2**20:,.1f} of {footprint['budget'] / 2**20:,.0f} MB, "
+                 f"{len(footprint['versions'])} workbook versions, {footprint['evictions']} evicted")
+
+def display_performance_panel():
+    """Stage waterfall of one of the last reruns of this server (every session), newest first."""
+    runs = analysis_func.recent_trace_runs()[::-1]
+    if not config.TRACE_ENABLED or not runs:
+        return
+    with st.sidebar.expander("Performance"):
+        by_id = {run['run_id']: run for run in runs}
+        selected = st.selectbox(
+            "Rerun", list(by_id), key="performance_run",
+            format_func=lambda run_id: f"{by_id[run_id]['time'][11:19]}  {by_id[run_id].get('user') or ''}  "
+                                       f"{by_id[run_id]['seconds'] * 1e3:,.0f} ms")
+        run = by_id[selected]
+        st.plotly_chart(gu_comp.trace_waterfall_chart(run), use_container_width=True)
+        slowest = sorted((span for span in run['spans'] if span['depth'] == 0), key=lambda span: -span['seconds'])[:3]
+        st.caption("Slowest stages: " + ", ".join(f"{span['stage']} {span['seconds'] * 1e3:,.0f} ms" for span in slowest))
+
+def render_chart(fig, name, **kwargs):
+    """st.plotly_chart timed as the 'chart: name' stage of the rerun."""
+    with analysis_func.trace_span(f"chart: {name}"):
+        st.plotly_chart(fig, **kwargs)
+
+def select_active_tab():
+    """Tab bar kept in session state; only the selected tab is built on a rerun."""
+    return st.radio("Section", config.DASHBOARD_TABS, horizontal=True, key="active_tab", label_visibility="collapsed")
+
+def tab_memo(tab_name, compute, *params):
+    """
+    Result of compute() for a tab, reused until params change; params are exactly the
+    inputs compute() reads (workbook hash, filters, widget values). Only the latest result
+    of each tab is kept.
+    """
+    key = params
+    results = st.session_state.setdefault("tab_results", {})
+    cached = results.get(tab_name)
+    if cached is None or cached[0] != key:
+        cached = (key, compute())
+        results[tab_name] = cached
+    return cached[1]
+
+def compute_job(job_key, kind, params, label, snapshot_id=None):
+    """
+    Result of an analysis job run in the compute pool for the loaded workbook, or None
+    while it runs, with a progress bar that polls on its own. A request with other params
+    replaces the job_key job and cancels the one it supersedes.
+    """
+    snapshot_id = snapshot_id or st.session_state.workbook_key[0]
+    request = (kind, snapshot_id, params)
+    jobs = st.session_state.setdefault("compute_jobs", {})
+    job = jobs.get(job_key)
+    status = data_func.job_status(job[1]) if job is not None and job[0] == request else None
+    if status is None or status['state'] in ('unknown', 'cancelling', 'cancelled'):
+        if job is not None:
+            data_func.cancel_job(job[1])
+        job = jobs[job_key] = (request, data_func.submit_job(kind, snapshot_id, params))
+        status = data_func.job_status(job[1])
+    if status['state'] == 'done':
+        return data_func.job_result(job[1])
+    if status['state'] == 'failed':
+        st.error(f"{label} failed: {status['error']}")
+        return None
+    job_progress(job[1], label)
+    return None
+
+@st.fragment(run_every=config.COMPUTE_POLL_SECONDS)
+def job_progress(job_id, label):
+    """Progress of a compute job, refreshed without rerunning the page until the job ends."""
+    status = data_func.job_status(job_id)
+    if status['state'] not in ('queued', 'running'):
+        st.rerun()
+    st.progress(min(status['progress'], 1.0), text=f"{label}: {status['message']}")
+
+def wait_for_job(kind, snapshot_id, params, label, job_id=None):
+    """
+    Run a compute job, or follow the already submitted job_id, and wait for it with a
+    progress bar; the script thread only sleeps meanwhile.
+    """
+    job_id = job_id or data_func.submit_job(kind, snapshot_id, params)
+    bar = st.progress(0.0, text=label)
+    status = data_func.job_status(job_id)
+    while status['state'] in ('queued', 'running'):
+        bar.progress(min(status['progress'], 1.0), text=f"{label}: {status['message']}")
+        time.sleep(config.COMPUTE_POLL_SECONDS)
+        status = data_func.job_status(job_id)
+    bar.empty()
+    return status
+
+def display_table(df, key, columns=None, formatter=None, download_label=None, download_name=None,
+                  page_size=config.TABLE_PAGE_SIZE):
+    """
+    One page of df with search, sort and column controls; only the visible page is sent
+    to the browser. The download holds every matching row with all columns.
+    """
+    all_columns = list(df.columns)
+    shown = st.multiselect("Columns", all_columns, default=list(columns or all_columns), key=f"{key}_columns")
+    shown = shown or all_columns
+    search_col, sort_col, order_col, page_col = st.columns([3, 2, 1, 1])
+    search = search_col.text_input("Search", key=f"{key}_search")
+    sort_by = sort_col.selectbox("Sort by", [None, *shown], format_func=lambda col: "(none)" if col is None else col,
+                                 key=f"{key}_sort")
+    ascending = order_col.radio("Order", ["Asc", "Desc"], horizontal=True, key=f"{key}_order") == "Asc"
+
+    with analysis_func.trace_span(f"table: {key}") as span:
+        positions = gu_comp.table_view(df, shown, search, sort_by, ascending)
+        span['rows'] = len(positions)
+        n_pages = max(-(-len(positions) // page_size), 1)
+        # The page number may be past the end once a search narrows the view
+        if st.session_state.get(f"{key}_page", 1) > n_pages:
+            st.session_state[f"{key}_page"] = n_pages
+        page = page_col.number_input("Page", min_value=1, max_value=n_pages, step=1, key=f"{key}_page")
+
+        st.dataframe(gu_comp.table_page(df, positions, page, page_size, shown, formatter), use_container_width=True)
+    first = (page - 1) * page_size
+    st.caption(f"Rows {min(first + 1, len(positions)):,}–{min(first + page_size, len(positions)):,} of "
+               f"{len(positions):,} matching ({len(df):,} total), page {page} of {n_pages}")
+    # Large exports are built on request instead of on every rerun
+    if download_name and (len(positions) <= config.TABLE_EAGER_DOWNLOAD_ROWS
+                          or st.button(f"Prepare download ({len(positions):,} rows)", key=f"{key}_prepare")):
+        st.download_button(label=download_label or f"Download {len(positions):,} rows",
+                           data=gu_comp.table_csv(df, positions, formatter),
+                           file_name=download_name,
+                           mime="text/csv",
+                           key=f"{key}_download")
+
+def display_overview_tab(overview_cube, selected_dates, selected_asins, selected_products, filtered_merged_data):
     st.header("Overview")
-    # Metrics using filtered data
+    # KPIs and trends come from the pre-aggregated cube for the current filters
+    granularity = st.radio("Trend", ["Daily", "Weekly"], horizontal=True, key="overview_granularity")
+    metrics, trend = analysis_func.query_overview_cube(
+        overview_cube, selected_dates, selected_asins, selected_products, weekly=granularity == "Weekly")
     col1, col2, col3, col4 = st.columns(4)
     with col1:
-        st.metric("Total Products", len(filtered_merged_data['ASIN'].unique()))
+        st.metric("Total Products", metrics['Total Products'])
     with col2:
-        st.metric("Total Sales", f"{filtered_merged_data['Sales'].sum():,.0f}")
+        st.metric("Total Sales", f"{metrics['Total Sales']:,.0f}")
     with col3:
-        st.metric("Average Sales", f"{filtered_merged_data['Sales'].mean():,.2f}")
+        st.metric("Average Sales", f"{metrics['Average Sales']:,.2f}")
     with col4:
-        st.metric("Total Profit", f"${filtered_merged_data['Gross Profit'].sum():,.2f}")
+        st.metric("Total Profit", f"${metrics['Total Profit']:,.2f}")
 
     # Sales Trend with filtered data
     st.subheader("Sales Trend")
-    sales_trend = filtered_merged_data.groupby('Date')['Sales'].sum().reset_index()
-    fig_sales = px.line(sales_trend, x='Date', y='Sales', title='Daily Sales Trend')
-    st.plotly_chart(fig_sales, use_container_width=True)
+    fig_sales = gu_comp.line_chart(trend, 'Date', 'Sales', f'{granularity} Sales Trend')
+    render_chart(fig_sales, 'sales trend', use_container_width=True)
 
     # Profit Trend with filtered data
     st.subheader("Profit Trend")
-    profit_trend = filtered_merged_data.groupby('Date')['Gross Profit'].sum().reset_index()
-    fig_profit = px.line(profit_trend, x='Date', y='Gross Profit', title='Daily Profit Trend')
-    st.plotly_chart(fig_profit, use_container_width=True)
+    fig_profit = gu_comp.line_chart(trend, 'Date', 'Gross Profit', f'{granularity} Profit Trend')
+    render_chart(fig_profit, 'profit trend', use_container_width=True)
 
     st.subheader("Filtered Data View")
-    st.dataframe(filtered_merged_data)
+    display_table(filtered_merged_data, "overview_table", download_name="filtered_data.csv")
 
 def display_inventory_status_tab(filtered_inventory_status,filtered_inventory_data):
     st.header("Inventory Status")
     # Inventory Status Summary with filtered data
     st.subheader("Inventory Status Summary")
     status_summary = filtered_inventory_status['Inventory Status'].value_counts()
+    status_summary = status_summary[status_summary > 0]
     fig_status = px.pie(values=status_summary.values, 
                         names=status_summary.index,
                         title='Distribution of Inventory Status')
-    st.plotly_chart(fig_status)
+    render_chart(fig_status, 'inventory status')
 
     # Detailed Inventory Status with filtered data
     st.subheader("Detailed Inventory Status")
     display_columns = config.INVENTORY_STATUS_COLUMNS
-    st.dataframe(filtered_inventory_status[display_columns])
+    display_table(filtered_inventory_status, "inventory_status_table", display_columns,
+                  analysis_func.inventory_status_for_display, download_name="inventory_status.csv")
 
     st.subheader("Upcoming Shipments")
     st.dataframe(filtered_inventory_data)
@@ -149,79 +292,86 @@ def display_shipment_planning_tab(filtered_inventory_status):
         min_value=datetime.now()
     )
     
-    shipment_plan = analysis_func.calculate_shipment_plan(filtered_inventory_status, target_date)
+    shipment_plan = tab_memo("Shipment Planning",
+                             lambda: analysis_func.calculate_shipment_plan(filtered_inventory_status, target_date),
+                             st.session_state.inventory_filter_key, target_date)
     
     # Shipment Requirements Visualization with filtered data
     st.subheader("Shipment Requirements")
-    fig_shipment = px.bar(shipment_plan, 
-                        x='Product Name',
-                        y='Required_Shipment_with_buffer_stock',
-                        title='Required Shipment Quantities by Product')
-    fig_shipment.update_layout(xaxis_tickangle=-45)
-    st.plotly_chart(fig_shipment, use_container_width=True)
+    fig_shipment = gu_comp.top_n_bar_chart(shipment_plan, 'Product Name', 'Required_Shipment_with_buffer_stock',
+                                           'Required Shipment Quantities by Product')
+    render_chart(fig_shipment, 'shipment plan', use_container_width=True)
 
     # Detailed Shipment Plan
     st.subheader("Detailed Shipment Plan")
-    st.dataframe(shipment_plan) 
+    display_table(shipment_plan, "shipment_plan_table", formatter=analysis_func.inventory_status_for_display,
+                  download_name="shipment_plan.csv")
 
 def display_loss_analysis_tab(selected_dates,temp_path):
     st.header("Loss Analysis")
-    loss_report = analysis_func.calculate.calculate_daily_loss_report(temp_path, "Profit")
+    # Computed over the whole workbook; the date filter only selects rows of the result
+    loss_report, product_losses = tab_memo("Loss Analysis", lambda: analysis_func.calculate.calculate_daily_loss_report(
+        temp_path, "Profit", per_asin=True, rolling_window=7), st.session_state.workbook_key[0])
     
     if selected_dates:
         loss_report = loss_report[loss_report.index.isin(selected_dates)]
     
     # Loss Trend Visualization
     st.subheader("Daily Loss Trend")
-    fig_loss = px.line(loss_report, 
-                        x=loss_report.index,
-                        y='Total Loss',
-                        title='Daily Loss Trend')
-    st.plotly_chart(fig_loss, use_container_width=True)
+    loss_trend = loss_report.rename_axis('Date').reset_index()
+    fig_loss = gu_comp.line_chart(loss_trend, 'Date', 'Total Loss', 'Daily Loss Trend')
+    render_chart(fig_loss, 'loss trend', use_container_width=True)
     
     # Product Count with Losses
     st.subheader("Products with Losses")
-    fig_count = px.bar(loss_report,
-                        x=loss_report.index,
-                        y='Product Count',
-                        title='Number of Products with Losses by Date')
-    st.plotly_chart(fig_count, use_container_width=True)
+    fig_count = gu_comp.time_bar_chart(loss_trend, 'Date', 'Product Count', 'Number of Products with Losses by Date')
+    render_chart(fig_count, 'loss product count', use_container_width=True)
     
     st.subheader("Detailed Loss Report")
     st.dataframe(loss_report)   
+
+    st.subheader("Losses by Product")
+    st.dataframe(product_losses[product_losses['Loss Days'] > 0])
     
 def display_profit_sale_analysis_tab(apply_filters,temp_path):
     st.header("Profit & Sales Change Analysis")
+    # Both sheets and every window come from a single pass
+    changes = tab_memo("Profit Analysis",
+                       lambda: analysis_func.calculate.calculate_change_metrics(temp_path, ("Profit", "Sales")),
+                       st.session_state.workbook_key[0])
+
+    st.subheader("Top Unnatural Changes")
+    col1, col2 = st.columns(2)
+    with col1:
+        change_window = st.selectbox("Window (days)", config.CHANGE_WINDOWS)
+    with col2:
+        top_n = st.number_input("Number of changes", min_value=1, value=20, step=1)
+    st.dataframe(analysis_func.calculate.top_changes(apply_filters(changes), int(top_n), change_window))
+
     st.subheader("Profit Change Analysis")
-    profit_analysis = analysis_func.calculate.calculate_averages_and_percentage_change(temp_path, "Profit")
+    profit_analysis = analysis_func.calculate.change_metrics_wide(changes, "Profit")
     filtered_profit = apply_filters(profit_analysis)
 
-    fig_profit_change = px.scatter(filtered_profit,
-                                    x='3-Day Average',
-                                    y='Percentage Change (3-day avg)',
-                                    hover_data=['Product Name'],
-                                    title='Profit Change vs 3-Day Average')
-    st.plotly_chart(fig_profit_change, use_container_width=True)
+    fig_profit_change = gu_comp.scatter_chart(filtered_profit, '3-Day Average', 'Percentage Change (3-day avg)',
+                                              ['Product Name'], 'Profit Change vs 3-Day Average')
+    render_chart(fig_profit_change, 'profit change', use_container_width=True)
 
     st.subheader("Detailed Profit Analysis")
     st.dataframe(filtered_profit)
 
     # Process Sales Sheet
     st.subheader("Sales Change Analysis")
-    sales_analysis = analysis_func.calculate.calculate_averages_and_percentage_change(temp_path, "Sales")
+    sales_analysis = analysis_func.calculate.change_metrics_wide(changes, "Sales")
     filtered_sales = apply_filters(sales_analysis)
 
-    fig_sales_change = px.scatter(filtered_sales,
-                                    x='3-Day Average',
-                                    y='Percentage Change (3-day avg)',
-                                    hover_data=['Product Name'],
-                                                title='Sales Change vs 3-Day Average')
-    st.plotly_chart(fig_sales_change, use_container_width=True)
+    fig_sales_change = gu_comp.scatter_chart(filtered_sales, '3-Day Average', 'Percentage Change (3-day avg)',
+                                             ['Product Name'], 'Sales Change vs 3-Day Average')
+    render_chart(fig_sales_change, 'sales change', use_container_width=True)
 
     st.subheader("Detailed Sales Analysis")
     st.dataframe(filtered_sales)
 
-def display_max_drr_analysis_tab(apply_filters,inventory_data):
+def display_max_drr_analysis_tab(selected_asins, selected_products):
     st.header("Maximum DRR Analysis")
 
     col1, col2, col3 = st.columns(3)
@@ -240,26 +390,27 @@ def display_max_drr_analysis_tab(apply_filters,inventory_data):
         manual_drr_max = None
         if use_manual_drr_max:
             manual_drr_max = st.number_input("Enter Manual DRR", min_value=0.0, value=100.0, step=0.1)
+        fractional_drr = st.checkbox("Show fractional Max DRR")
     if st.button("Calculate Maximum DRR"):
-        filtered_inventory_data = apply_filters(inventory_data)
-        max_drr_results = analysis_func.calculate.calculate_max_drr_with_push_drr(
-            filtered_inventory_data, 
-            target_date, 
-            future_date,
-            manual_drr_max if use_manual_drr_max else None
-        )
-
+        st.session_state.max_drr_requested = True
+    # Once requested, changed inputs recompute in the background and cancel the superseded job
+    max_drr_results = None
+    if st.session_state.get("max_drr_requested"):
+        max_drr_results = compute_job("Maximum DRR Analysis", "max_drr", {
+            'target_date': target_date,
+            'future_date': future_date,
+            'manual_drr': manual_drr_max if use_manual_drr_max else None,
+            'fractional': fractional_drr,
+            'asins': list(selected_asins),
+            'products': list(selected_products),
+        }, "Calculating maximum DRR")
+
+    if max_drr_results is not None:
         if not max_drr_results.empty:
             # Visualization
             st.subheader("Maximum DRR Distribution")
-            fig = px.bar(
-                max_drr_results,
-                x='Product Name',
-                y='Max DRR',
-                title='Maximum Sustainable DRR by Product'
-            )
-            fig.update_layout(xaxis_tickangle=-45)
-            st.plotly_chart(fig, use_container_width=True)
+            fig = gu_comp.top_n_bar_chart(max_drr_results, 'Product Name', 'Max DRR', 'Maximum Sustainable DRR by Product')
+            render_chart(fig, 'max drr', use_container_width=True)
 
             # Summary Statistics
             col1, col2, col3 = st.columns(3)
@@ -290,7 +441,12 @@ def display_daily_drr_calculator_tab(uploaded_file):
         target_date = st.date_input("Select Target Date", min_value=datetime.today())
 
         if st.button("Calculate DRR"):
-            output = analysis_func.calculate.calculate_daily_drr(uploaded_file, sheet_name, target_date)
+            st.session_state.daily_drr_requested = True
+        output = None
+        if st.session_state.get("daily_drr_requested"):
+            output = compute_job("DRR Timeline", "daily_drr", {'sheet_name': sheet_name, 'target_date': target_date},
+                                 "Calculating daily DRR")
+        if output is not None:
             st.success("Calculation Complete!")
             st.dataframe(output)
 
@@ -305,7 +461,7 @@ def display_daily_drr_calculator_tab(uploaded_file):
     else:
         st.warning(gu_lang.LangConfig.get("UPLOAD_WARNING"))
 
-def display_label_planning_tab(uploaded_file,inventory_status,selected_dates,selected_asins,selected_products):
+def display_label_planning_tab(uploaded_file,inventory_status,selected_asins,selected_products):
     st.header("Labels Planning")
                 
     if uploaded_file is not None:
@@ -315,24 +471,15 @@ def display_label_planning_tab(uploaded_file,inventory_status,selected_dates,sel
             min_value=datetime.now(),
             key="label_target_date"
         )
-        label_plan =gu_comp.labal_data_calculation(uploaded_file, inventory_status, target_date)
+        try:
+            label_plan =gu_comp.labal_data_calculation(uploaded_file, inventory_status, target_date)
+        except Exception as e:
+            st.error(f"Error reading labels sheet: {e}")
+            return
         # label_plan = analysis_func.calculate.process_label_planning(uploaded_file, inventory_status, target_date)
 
         if not label_plan.empty:
-            filtered_label_plan = label_plan.copy()
-            if selected_dates:
-                filtered_label_plan = filtered_label_plan[
-                    filtered_label_plan['Date'].isin(selected_dates)
-    ]
-            if selected_asins:
-                filtered_label_plan = filtered_label_plan[
-                    filtered_label_plan['ASIN'].isin(selected_asins)
-                ]
-
-            if selected_products:
-                filtered_label_plan = filtered_label_plan[
-                    filtered_label_plan['Product Name'].isin(selected_products)
-                ]
+            filtered_label_plan = data_func.filter_rows(label_plan, asins=selected_asins, products=selected_products)
 
             st.subheader("Label Plan")
             display_columns = config.LABEL_PLAN_COLUMNS
@@ -348,13 +495,8 @@ def display_label_planning_tab(uploaded_file,inventory_status,selected_dates,sel
             with col3:
                 total_required = filtered_label_plan['Required Labels (Stocks+Packed+New Orders)'].sum()
                 st.metric("Total Required Inventory", f"{total_required:,.0f}")
-            st.dataframe(filtered_label_plan[display_columns])     
-            st.download_button(
-                    label="Download Filtered Label Plan",
-                data=filtered_label_plan.to_csv(index=False),
-                file_name="filtered_label_plan.csv",
-                mime="text/csv"
-            )
+            display_table(filtered_label_plan, "label_plan_table", display_columns,
+                          download_label="Download Filtered Label Plan", download_name="filtered_label_plan.csv")
         else:
             st.warning(gu_lang.LangConfig.get("COLUMNS_MISSING_ERROR"))
     else:
@@ -405,12 +547,16 @@ def display_target_sale_mang_tab():
 
 def display_us_product_shipment_planing_tab(us_products_data,filtered_inventory_status):
     st.header(gu_lang.LangConfig.get("TAB_US_PRODUCTS"))
-    if not us_products_data.empty:
+    if us_products_data.attrs.get('error'):
+        st.error(us_products_data.attrs['error'])
+    elif not us_products_data.empty:
         target_date = st.date_input(gu_lang.LangConfig.get("SELECT_TARGET_DATE"),
                                     value=datetime.now() + timedelta(days=30),
                                     min_value=datetime.now(),
                                     key="us_target_date")
-        us_shipment_plan = analysis_func.calculate.calculate_us_shipment_plan(filtered_inventory_status, us_products_data, target_date)
+        us_shipment_plan = tab_memo("US Products Shipment Planning",
+                                    lambda: analysis_func.calculate.calculate_us_shipment_plan(filtered_inventory_status, us_products_data, target_date),
+                                    st.session_state.inventory_filter_key, target_date)
 
         st.subheader("Updated Shipment Plan (US Products)")
         display_columns = config.US_PRODUCTS_COLUMNS
@@ -423,6 +569,179 @@ def display_us_product_shipment_planing_tab(us_products_data,filtered_inventory_
     else:
         st.warning(gu_lang.LangConfig.get("UPLOAD_FILE_NO_US_PRODUCT"))
 
+def Performance_Tracker(uploaded_file, sales_sheet="Sales", profit_sheet="Profit", tracker_sheet="Tracker"):
+    """
+    Function to calculate and display average sales, profit, and DRR based on a selected date range,
+    week-over-week analysis, or week-by-year analysis.
+    """
+    try:
+        # Read sales, profit, and tracker data
+        sales_data = analysis_func.read_sheet(uploaded_file, sales_sheet)
+        profit_data = analysis_func.read_sheet(uploaded_file, profit_sheet)
+        tracker_data = analysis_func.read_sheet(uploaded_file, tracker_sheet)
+
+        # Ensure necessary columns exist
+        if not {'ASIN', 'Product Name'}.issubset(sales_data.columns) or not {'ASIN', 'Product Name'}.issubset(profit_data.columns):
+            st.error("Missing 'ASIN' or 'Product Name' columns in the dataset.")
+            return
+
+        # Identify date columns dynamically
+        date_columns_sales = [col for col in sales_data.columns if col not in ['ASIN', 'Product Name']]
+        date_columns_profit = [col for col in profit_data.columns if col not in ['ASIN', 'Product Name']]
+
+        # Extract benchmark-year date columns
+        date_mapping = {col: pd.to_datetime(col, errors='coerce') for col in date_columns_sales}
+        date_columns_2025 = analysis_func.benchmark_columns(date_columns_sales)
+
+        # Sort dates
+        sorted_dates = sorted(date_mapping.items(), key=lambda x: x[1])
+
+        # Group dates into weeks by year
+        week_groups = {}
+        for col, date in sorted_dates:
+            if pd.notna(date):
+                year, week_num = date.year, date.isocalendar()[1]
+                week_label = f"Week {week_num} ({year})"
+                if week_label not in week_groups:
+                    week_groups[week_label] = []
+                week_groups[week_label].append(col)
+
+        # Add 'Custom' option
+        week_options = list(week_groups.keys()) + ["Custom"]
+        selected_option = st.selectbox("📅 Select Date Range", week_options)
+
+        if selected_option == "Custom":
+            # Custom Date Selection
+            col1, col2 = st.columns(2)
+            sorted_dates_str = [str(date.date()) for _, date in sorted_dates if pd.notna(date)]
+            start_date = col1.selectbox("📅 Select Start Date", sorted_dates_str)
+            end_date = col2.selectbox("📅 Select End Date", sorted_dates_str, index=len(sorted_dates_str) - 1)
+
+            # Convert user-selected dates back to column format
+            selected_dates_sales = [col for col, date in sorted_dates if str(date.date()) >= start_date and str(date.date()) <= end_date]
+        else:
+            # Week-based selection
+            selected_dates_sales = week_groups[selected_option]
+
+        selected_dates_profit = selected_dates_sales
+
+        # Convert selected date columns to numeric
+        sales_data[selected_dates_sales] = sales_data[selected_dates_sales].apply(pd.to_numeric, errors='coerce')
+        profit_data[selected_dates_profit] = profit_data[selected_dates_profit].apply(pd.to_numeric, errors='coerce')
+
+        # Calculate average sales & profit for selected date range
+        sales_data["Average Sales"] = sales_data[selected_dates_sales].mean(axis=1)
+        profit_data["Total Profit"] = profit_data[selected_dates_profit].sum(axis=1)
+        profit_data["Average Profit"] = profit_data[selected_dates_profit].mean(axis=1)
+
+        # Merge sales and profit on ASIN & Product Name
+        Pre_final_data = sales_data[['ASIN', 'Product Name', 'Average Sales']].merge(
+            profit_data[['ASIN', 'Product Name', "Total Profit", 'Average Profit']],
+            on=['ASIN', 'Product Name'],
+            how='inner'
+        )
+
+        final_data = Pre_final_data[['ASIN', 'Product Name', 'Average Sales', "Total Profit", 'Average Profit']].merge(
+            tracker_data[['ASIN', 'Product Name', 'Target DRR']],
+            on=['ASIN', 'Product Name'],
+            how='inner'
+        )
+
+        # Compute performance status
+        final_data["Performance Status"] = np.where(
+            final_data["Target DRR"] < final_data["Average Sales"], "Leading ✅", "Lagging ⚠️"
+        )
+
+        # **Integrate Benchmark Calculation**
+        benchmark_data = analysis_func.calculate_benchmarks(sales_data, profit_data, date_columns_2025)
+        final_data = final_data.merge(benchmark_data, left_index=True, right_index=True, how='left')
+
+        # Display results in Streamlit
+        num_days = len(selected_dates_sales)
+        st.write(f"### 📊 Performance & Benchmarks ({selected_option} - {num_days} Days)")
+        st.dataframe(final_data)
+
+        # **Download Option**
+        csv = final_data.to_csv(index=False).encode('utf-8')
+        st.download_button("Download CSV 📥", csv, "Performance_Report.csv", "text/csv")
+
+    except Exception as e:
+        st.error(f"Error processing file: {str(e)}")
+        st.exception(e)
+        
+        
+
+def process_data(uploaded_file, sales_sheet="Sales", profit_sheet="Profit", tracker_sheet="Tracker"):
+    """Process Excel data and calculate metrics"""
+    try:
+        sales_data = analysis_func.read_sheet(uploaded_file, sales_sheet)
+        profit_data = analysis_func.read_sheet(uploaded_file, profit_sheet)
+        tracker_data = analysis_func.read_sheet(uploaded_file, tracker_sheet)
+        
+        required_columns = {'ASIN', 'Product Name'}
+        if not required_columns.issubset(sales_data.columns) or not required_columns.issubset(profit_data.columns):
+            st.error("Missing required columns 'ASIN' or 'Product Name' in the dataset.")
+            return None
+        
+        date_columns_sales = [col for col in sales_data.columns if col not in required_columns]
+        date_mapping = {col: pd.to_datetime(col, errors='coerce') for col in date_columns_sales}
+        sorted_dates = sorted(date_mapping.items(), key=lambda x: x[1])
+        week_groups = {}
+        for col, date in sorted_dates:
+            if pd.notna(date):
+                year, week_num = date.year, date.isocalendar()[1]
+                week_label = f"Week {week_num} ({year})"
+                week_groups.setdefault(week_label, []).append(col)
+        
+        toggle_option = st.toggle("Enable Week-wise Selection", value=False)
+        
+        if toggle_option:
+            week_options = list(week_groups.keys())
+            selected_option = st.selectbox("📅 Select Week", week_options)
+            selected_dates_sales = week_groups[selected_option]
+        else:
+            sorted_dates_str = [str(date.date()) for _, date in sorted_dates if pd.notna(date)]
+            start_date = st.selectbox("📅 Select Start Date", sorted_dates_str, index=max(len(sorted_dates_str) - 1,0))
+            end_date = st.selectbox("📅 Select End Date", sorted_dates_str, index=len(sorted_dates_str) - 1)
+            selected_dates_sales = [col for col, date in sorted_dates if start_date <= str(date.date()) <= end_date]
+        
+        # Benchmarks run in the compute pool; a newer date selection replaces a running job
+        final_data = compute_job("performance_report", "performance_report",
+                                 {'selected_dates': list(selected_dates_sales)}, "Computing performance",
+                                 analysis_func.workbook_sha256(uploaded_file))
+        if final_data is None:
+            return None
+        
+        num_days = len(selected_dates_sales)
+        st.write(f"### 📊 Performance & Benchmarks ({num_days} Days)")
+        
+        st.subheader("Filter Data")
+        performance_filter = st.multiselect("Filter by Performance Status", 
+                                          options=final_data["Performance Status"].unique(),
+                                          key="performance_filter")
+        
+        filtered_data = final_data.copy()
+        if performance_filter:
+            filtered_data = filtered_data[filtered_data["Performance Status"].isin(performance_filter)]
+        
+        st.subheader("Performance Data")
+        st.dataframe(filtered_data)
+        
+        excel_buffer = io.BytesIO()
+        with pd.ExcelWriter(excel_buffer, engine='xlsxwriter') as writer:
+            filtered_data.to_excel(writer, sheet_name='Performance_Data', index=False)
+        
+        excel_buffer.seek(0)
+        st.download_button("Download Excel 📥", excel_buffer, 
+                          "Performance_Report.xlsx", 
+                          "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+        
+        return filtered_data, num_days
+        
+    except Exception as e:
+        st.error(f"Error processing file: {str(e)}")
+        return None
+
 def display_sale_profit_any_tool_tab(uploaded_file):
         # st.set_page_config(page_title="Sales & Profit Performance Tracker", layout="wide")
     
@@ -441,7 +760,10 @@ def display_sale_profit_any_tool_tab(uploaded_file):
                 uploaded_file = st.file_uploader("📤 Upload Excel File", type=["xlsx"])
     
                 if uploaded_file is not None:
-                    result = analysis_func.process_data(uploaded_file)
+                    # Scheduled reports are recomputed from the latest upload at every send
+                    data_func.save_upload(uploaded_file, config.PERFORMANCE_WORKBOOK_PATH,
+                                          st.session_state.get("current_user"))
+                    result = process_data(uploaded_file)
         
                     if result is not None:
                         filtered_data, num_days = result
@@ -466,22 +788,24 @@ def display_sale_profit_any_tool_tab(uploaded_file):
                                 if st.button("Send Email Now 📨", type="primary"):
                                     if emails_input:
                                         receiver_emails = [email.strip() for email in emails_input.split('\n') if '@' in email]
-                                        if receiver_emails:
-                                            sender_email = "info@shavgun.com"
-                                            password = "Lapu971915@#"
+                                        if data_func.smtp_account_error() is not None:
+                                            st.error(f"❌ Error sending emails: {data_func.smtp_account_error()}")
+                                        elif receiver_emails:
                                             subject = "SVA Analytics and PPC Performance Report"
                                 
                                             try:
-                                                for receiver_email in receiver_emails:
-                                                    analysis_func.send_email_via_hostinger_for_performance_tracker(
-                                                        sender_email,
-                                                        receiver_email,
-                                                        subject,
-                                                        filtered_data,
-                                                        password,
-                                                        num_days
-                                                    )
-                                                st.success("✅ Emails sent successfully!")
+                                                failures = analysis_func.send_email_via_hostinger_for_performance_tracker(
+                                                    config.SMTP_USER,
+                                                    receiver_emails,
+                                                    subject,
+                                                    filtered_data,
+                                                    config.SMTP_PASSWORD,
+                                                    num_days
+                                                )
+                                                for receiver_email, error in failures.items():
+                                                    st.error(f"Error sending email to {receiver_email}: {error}")
+                                                if len(failures) < len(receiver_emails):
+                                                    st.success(f"✅ Emails sent successfully to {len(receiver_emails) - len(failures)} of {len(receiver_emails)} receivers!")
                                             except Exception as e:
                                                 st.error(f"❌ Error sending emails: {str(e)}")
                                         else:
@@ -524,34 +848,33 @@ def display_sale_profit_any_tool_tab(uploaded_file):
                                         value=1
                                     )
                     
+                                pin_workbook = st.checkbox(
+                                    "Always report on this upload",
+                                    help="By default each send uses the latest uploaded workbook"
+                                )
+                    
                                 if st.button("Schedule Emails ⏰", type="primary"):
                                     if emails_input:
                                         receiver_emails = [email.strip() for email in emails_input.split('\n') if '@' in email]
                                         if receiver_emails:
-                                            sender_email = "info@shavgun.com"
-                                            password = "Lapu971915@#"
                                             subject = "SVA Analytics and PPC Performance Report"
                                 
                                             try:
                                                 schedule_datetime = datetime.combine(schedule_date, schedule_time)
                                     
-                                                # Pass frequency parameters to schedule_email function
-                                                schedule_params = {
-                                                    'frequency': frequency,
-                                                    'weekdays': weekdays if frequency == "Weekly" else None,
-                                                    'monthly_day': monthly_day if frequency == "Monthly" else None,
-                                                    'schedule_datetime': schedule_datetime
-                                                }
-                                    
+                                                # The report is recomputed at every send
                                                 analysis_func.schedule_email(
-                                                    sender_email,
                                                     receiver_emails,
                                                     subject,
-                                                    filtered_data,
-                                                    password,
+                                                    uploaded_file,
                                                     num_days,
-                                                    schedule_time,
-                                                    **schedule_params
+                                                    frequency,
+                                                    schedule_datetime,
+                                                    weekdays=weekdays if frequency == "Weekly" else None,
+                                                    monthly_day=monthly_day if frequency == "Monthly" else None,
+                                                    performance_filter=st.session_state.get("performance_filter"),
+                                                    pin_workbook=pin_workbook,
+                                                    user=st.session_state.get("current_user")
                                                 )
                                                 st.success("✅ Email scheduling configured successfully!")
                                             except Exception as e:
@@ -560,3 +883,13 @@ def display_sale_profit_any_tool_tab(uploaded_file):
                                             st.warning("⚠️ Please enter valid email addresses")
                                     else:
                                         st.warning("⚠️ Please enter at least one email address")
+
+                                schedules = data_func.report_schedules()
+                                if schedules:
+                                    st.subheader("Scheduled Reports")
+                                    st.dataframe(pd.DataFrame(schedules), hide_index=True)
+                                    cancel_id = st.selectbox("Cancel schedule", [None, *[row['id'] for row in schedules]],
+                                                             format_func=lambda schedule_id: "-" if schedule_id is None else f"#{schedule_id}")
+                                    if cancel_id is not None and st.button("Cancel Schedule"):
+                                        data_func.cancel_report_schedule(cancel_id)
+                                        st.rerun()
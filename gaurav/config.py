@@ -1,8 +1,84 @@
 # Application configuration settings
+import os
+
 APP_TITLE = "Inventory Management Dashboard"
 DEFAULT_PORT = 5000
 DEFAULT_HOST = "0.0.0.0"
 SAVED_FILE_PATH = "files/main_file.xlsx"
+# One JSON line per stored upload: time, hashes of the new and replaced workbook, size, name, user
+INGEST_LOG_PATH = "files/ingest_log.jsonl"
+
+# Workbook snapshot settings
+SNAPSHOT_DIR = "files/snapshots"
+# Snapshots kept on disk, most recently written or read first; older ones are deleted
+SNAPSHOT_KEEP = max(1, int(os.environ.get("GU_SNAPSHOT_KEEP", "10")))
+# Parsed and ingested workbook versions shared by all sessions; least recently used
+# versions are dropped once the store holds more than this many MB
+SNAPSHOT_MEMORY_BUDGET_MB = int(os.environ.get("GU_SNAPSHOT_BUDGET_MB", "512"))
+
+# Debug artifacts: intermediate frames written as Parquet by a background thread, off unless GU_ARTIFACTS=1
+ARTIFACTS_ENABLED = os.environ.get("GU_ARTIFACTS", "0") == "1"
+ARTIFACT_DIR = "files/artifacts"
+ARTIFACT_COMPRESSION = "zstd"
+
+# Outgoing mail; GU_SMTP_DEBUG=1 sends to the local server of `python -m data.mailing` instead
+SMTP_DEBUG = os.environ.get("GU_SMTP_DEBUG", "0") == "1"
+SMTP_HOST = "localhost" if SMTP_DEBUG else "smtp.hostinger.com"
+SMTP_PORT = 1025 if SMTP_DEBUG else 587
+SMTP_TIMEOUT = 30
+SMTP_RETRIES = 3
+SMTP_BACKOFF_SECONDS = 1.0
+SMTP_MESSAGES_PER_CONNECTION = 50
+# Account every dashboard mail (OTPs, new user notices, reports) is sent from; kept in the
+# server environment, never in the source or the schedule database
+SMTP_USER = os.environ.get("GU_SMTP_USER", "")
+SMTP_PASSWORD = os.environ.get("GU_SMTP_PASSWORD", "")
+
+# Report schedules: SQLite job table run by one worker process; the worker wakes at the
+# next due run or every SCHEDULER_POLL_SECONDS, and its lease expires after SCHEDULER_LEASE_SECONDS
+SCHEDULE_DB_PATH = "files/schedules.db"
+# Latest Performance Tracker upload: scheduled reports are recomputed from it at every send.
+# A schedule pinned to one upload reads its copy in REPORT_WORKBOOK_DIR, named by its SHA-256
+PERFORMANCE_WORKBOOK_PATH = "files/performance_tracker.xlsx"
+REPORT_WORKBOOK_DIR = "files/report_workbooks"
+SCHEDULER_POLL_SECONDS = 60
+SCHEDULER_LEASE_SECONDS = 180
+
+# Background compute: heavy analysis runs in a pool of worker processes; GU_COMPUTE_INLINE=1
+# runs the jobs in the calling thread instead (debugging, tests)
+COMPUTE_INLINE = os.environ.get("GU_COMPUTE_INLINE", "0") == "1"
+COMPUTE_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))
+COMPUTE_POLL_SECONDS = 0.5
+COMPUTE_KEEP_JOBS = 32
+
+# Per-product kernels split over GU_SHARD_WORKERS processes (1 = off); each shard gets at
+# least SHARD_MIN_ROWS products, below that the process round trip costs more than it saves.
+# Compute jobs shard too, so a busy server can run up to COMPUTE_WORKERS x SHARD_WORKERS
+# kernel processes (plus the server's own pool); size the two together for the CPU count
+SHARD_WORKERS = max(1, int(os.environ.get("GU_SHARD_WORKERS", "1")))
+SHARD_MIN_ROWS = 1000
+
+# Stage timings: every rerun and analysis step is logged as a JSON line to TRACE_LOG_PATH
+# (rotated at TRACE_LOG_MAX_MB) and the last TRACE_KEEP_RUNS reruns are shown to admins;
+# off unless GU_TRACE=1
+TRACE_ENABLED = os.environ.get("GU_TRACE", "0") == "1"
+TRACE_LOG_PATH = "files/trace.jsonl"
+TRACE_LOG_MAX_MB = 50
+TRACE_KEEP_RUNS = 20
+
+# Results kept by the dashboard cache (components/gu_cache.py)
+CACHE_MAX_ENTRIES = 64
+
+# Charts: points kept per time series, bars per product chart, cached figures
+CHART_MAX_POINTS = 500
+CHART_TOP_N = 30
+FIGURE_CACHE_ENTRIES = 128
+
+# Tables: rows sent to the browser per page, cached search/sort results
+TABLE_PAGE_SIZE = 50
+TABLE_VIEW_CACHE_ENTRIES = 32
+# Larger exports are only built when asked for
+TABLE_EAGER_DOWNLOAD_ROWS = 20000
 
 # Data processing settings
 DATE_FORMAT = "%Y%m%d"
@@ -33,6 +109,44 @@ DEFAULT_START_DATE = None  # Will be set to datetime.now() when used
 DEFAULT_DRR_VALUE = 100.0
 MIN_DRR_VALUE = 0.0
 DRR_STEP = 0.1
+# Daily_Run_Rate is the mean Sales over this many days
+DRR_WINDOW = 5
+# Rolling statistics computed for Sales and Gross Profit
+ROLLING_WINDOWS = (5, 7, 30)
+EWM_SPAN = 7
+# Trend % compares the mean of the first window with the mean of the second
+TREND_WINDOWS = (7, 30)
+
+# Target DRR tiers
+TOP_DRR_MULTIPLIER = 1.20
+MID_SECTION_DRR_MULTIPLIER = 1.15
+DEFAULT_DRR_MULTIPLIER = 1.10
+TOP_PRODUCTS = [
+    "B09VPLLPMB", "B071LQFHPY", "B072M2MTK1", "B09W2VSN54", "B09W9SX1W8",
+    "B09TXNSQDJ", "B07GNLN5K2", "B07YWWXLJS", "B071ZQ5J4X", "B09WZYCXRQ",
+    "B07J14W55P", "B07Q4TD8RS", "B07J1JZJY2", "B09VS77ZDT", "B071ZMQ3X8",
+    "B072PYW2VM", "B078Z17WQ9", "B07MCKSNZQ", "B0B8HDYRZQ", "B09W28G7L3",
+    "B07895B2VZ", "B07895DHYQ", "B071W92ZRG", "B07GCQDX6M", "B07MV28C29",
+    "B07FSYZM6H", "B072Q32KJ2", "B07Y1LCD7T", "B07FSZ921M", "B0BY54K6C3"
+]
+MID_SECTION_PRODUCTS = [
+    "B071J8GQCJ", "B07W8THF1Q", "B0788XRBJ5", "B0BB9QN29D", "B0788WTFPY",
+    "B071FNLVF5", "B078Z2KPT5", "B07J1L77D3", "B072M55KZT", "B07FSV4FNK",
+    "B07M9QQ8XL", "B086X1WC4N", "B0789JGL72", "B0788X172Q", "B09W2KHTWX",
+    "B07M7VQ1N1", "B072Q1NW1T", "B09V1FGQ8Z", "B07J1WMHT2", "B07GCPD2DR",
+    "B07M7WL2HD", "B09V7XXJ52", "B07J1DS78L", "B072Q22P7Q", "B079G5H8XP",
+    "B081RJL36N", "B07BY4KRKN", "B07QZ4138D", "B07YYCLVGQ", "B07J1K4B3R",
+    "B07MT9CY7B", "B07N8XR8C4", "B07MGXBWB"
+]
+# DRR Timeline: the horizon is split into equal phases with these multipliers
+DRR_PHASE_MULTIPLIERS = (0.9, 1.1, 1.3)
+
+# Profit & Sales change analysis windows (days)
+CHANGE_WINDOWS = (3, 5, 7, 14, 30)
+
+# Performance Tracker benchmarks: best profit/unit among the top sales days of this year
+BENCHMARK_YEAR = 2025
+BENCHMARK_TOP_N = 5
 
 # Month Configuration
 MONTH_DAYS = {
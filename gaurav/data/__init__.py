@@ -3,3 +3,6 @@ from .delete import *  # Import everything from functions.py
 from .filter import *  # Import everything from functions.py
 from .update import *  # Import everything from functions.py
 from .mailing import *  # Import everything from functions.py
+from .scheduler import *  # Import everything from functions.py
+from .executor import *  # Import everything from functions.py
+from .upload import *  # Import everything from functions.py
@@ -0,0 +1,166 @@
+import uuid
+import threading
+import functools
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import config
+import analysis as analysis_func
+from analysis.read import WorkbookSnapshot, read_sheet
+from analysis.shard import cancellation
+from .filter import filter_rows
+
+# Worker pool and the shared status table jobs report progress to, created on first use
+_POOL = None
+_MANAGER = None
+_STATUS = None
+# Job id -> Future, oldest first; finished jobs beyond COMPUTE_KEEP_JOBS are forgotten
+_JOBS = {}
+_LOCK = threading.Lock()
+
+
+class JobCancelled(Exception):
+    """Raised inside a running job once cancel_job() has been called for it."""
+
+
+def _workbook_snapshot_job(workbook, params, progress):
+    progress(0.1, "Parsing workbook")
+    analysis_func.load_workbook_snapshot(params['path'])
+
+
+def _max_drr_job(workbook, params, progress):
+    progress(0.1, "Reading inventory")
+    inventory = analysis_func.read_inventory_data(workbook, "Inventory")
+    inventory = filter_rows(inventory, asins=params['asins'], products=params['products'])
+    progress(0.5, "Solving maximum DRR")
+    return analysis_func.calculate.calculate_max_drr_with_push_drr(
+        inventory, params['target_date'], params['future_date'], params['manual_drr'], fractional=params['fractional'])
+
+
+def _daily_drr_job(workbook, params, progress):
+    progress(0.2, "Projecting daily DRR")
+    return analysis_func.calculate.calculate_daily_drr(workbook, params['sheet_name'], params['target_date'])
+
+
+def _performance_report_job(workbook, params, progress):
+    progress(0.1, "Reading sheets")
+    sheets = [read_sheet(workbook, sheet) for sheet in ("Sales", "Profit", "Tracker")]
+    progress(0.4, "Computing benchmarks")
+    return analysis_func.performance_report(*sheets, params['selected_dates'])
+
+
+# Job kind -> function(workbook snapshot, params, progress) run in a worker process
+COMPUTE_JOBS = {
+    'workbook_snapshot': _workbook_snapshot_job,
+    'max_drr': _max_drr_job,
+    'daily_drr': _daily_drr_job,
+    'performance_report': _performance_report_job,
+}
+
+
+def _raise_if_cancelled(status, job_id):
+    if status.get((job_id, 'cancel')):
+        raise JobCancelled(job_id)
+
+
+def _run_job(job_id, kind, snapshot_id, params, status):
+    # Module-level and bound with partial so sharded kernels can take it to their workers
+    check = functools.partial(_raise_if_cancelled, status, job_id)
+
+    def progress(fraction, message):
+        check()
+        status[job_id] = (fraction, message)
+
+    # Cancellation is noticed at the next progress report or kernel chunk (see run_sharded)
+    with cancellation(check):
+        progress(0.0, "Started")
+        result = COMPUTE_JOBS[kind](WorkbookSnapshot(snapshot_id), params, progress)
+        progress(1.0, "Finished")
+    return result
+
+
+def _pool():
+    global _POOL, _MANAGER, _STATUS
+    if _POOL is None:
+        # Spawned, not forked: the server process runs threads that must not be copied
+        context = multiprocessing.get_context('spawn')
+        if _MANAGER is None:
+            _MANAGER = context.Manager()
+            _STATUS = _MANAGER.dict()
+        _POOL = ProcessPoolExecutor(max_workers=config.COMPUTE_WORKERS, mp_context=context)
+    return _POOL
+
+
+def _forget_finished_jobs():
+    finished = [job_id for job_id, future in _JOBS.items() if future.done()]
+    for job_id in finished[:max(len(_JOBS) - config.COMPUTE_KEEP_JOBS, 0)]:
+        del _JOBS[job_id]
+        _STATUS.pop(job_id, None)
+        _STATUS.pop((job_id, 'cancel'), None)
+
+
+def submit_job(kind, snapshot_id, params):
+    """
+    Queue the COMPUTE_JOBS[kind] analysis for the stored workbook snapshot_id (its hash)
+    with params, and return a job id for job_status(), job_result() and cancel_job().
+    """
+    global _POOL, _STATUS
+    if kind not in COMPUTE_JOBS:
+        raise ValueError(f"Unknown compute job: {kind}")
+    job_id = uuid.uuid4().hex
+    with _LOCK:
+        if config.COMPUTE_INLINE:
+            if _STATUS is None:
+                _STATUS = {}
+            future = Future()
+            try:
+                future.set_result(_run_job(job_id, kind, snapshot_id, params, _STATUS))
+            except Exception as e:
+                future.set_exception(e)
+        else:
+            try:
+                future = _pool().submit(_run_job, job_id, kind, snapshot_id, params, _STATUS)
+            except BrokenProcessPool:
+                # A worker died (out of memory, killed); start a fresh pool
+                _POOL = None
+                future = _pool().submit(_run_job, job_id, kind, snapshot_id, params, _STATUS)
+        _JOBS[job_id] = future
+        _forget_finished_jobs()
+    return job_id
+
+
+def job_status(job_id):
+    """
+    State of a job: 'queued', 'running', 'cancelling' (asked to stop, not stopped yet),
+    'done', 'failed', 'cancelled', or 'unknown' for ids this process does not know
+    (forgotten or from before a restart), with the progress fraction and message last
+    reported and the error of a failed job.
+    """
+    future = _JOBS.get(job_id)
+    if future is None:
+        return {'state': 'unknown', 'progress': 0.0, 'message': "", 'error': None}
+    progress, message = _STATUS.get(job_id, (0.0, "Queued"))
+    error = None
+    if future.cancelled():
+        state = 'cancelled'
+    elif future.done():
+        error = future.exception()
+        state = 'cancelled' if isinstance(error, JobCancelled) else 'failed' if error else 'done'
+        error = str(error) if state == 'failed' else None
+    elif _STATUS.get((job_id, 'cancel')):
+        state = 'cancelling'
+    else:
+        state = 'running' if future.running() else 'queued'
+    return {'state': state, 'progress': progress, 'message': message, 'error': error}
+
+
+def job_result(job_id):
+    """Result of a finished job; raises the job's error if it failed."""
+    return _JOBS[job_id].result()
+
+
+def cancel_job(job_id):
+    """Drop a queued job, or ask a running one to stop at its next progress report or kernel chunk."""
+    future = _JOBS.get(job_id)
+    if future is not None and not future.cancel() and not future.done():
+        _STATUS[(job_id, 'cancel')] = True
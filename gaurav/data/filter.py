@@ -0,0 +1,71 @@
+import weakref
+import threading
+import numpy as np
+import pandas as pd
+from analysis.trace import traced
+
+FILTER_COLUMNS = ('ASIN', 'Product Name', 'Date')
+
+# id(frame) -> (weak reference, inverted index); frames are indexed once and must not be modified
+_INDEXES = {}
+_INDEX_LOCK = threading.Lock()
+
+
+def _forget_index(ref, frame_id):
+    entry = _INDEXES.get(frame_id)
+    if entry is not None and entry[0] is ref:
+        del _INDEXES[frame_id]
+
+
+def _column_index(values):
+    """Distinct values of a column and the row positions of each, grouped in ascending order."""
+    codes, uniques = pd.factorize(values)
+    order = np.argsort(codes, kind='stable')
+    order = order[np.count_nonzero(codes < 0):]
+    starts = np.r_[0, np.cumsum(np.bincount(codes[codes >= 0], minlength=len(uniques)))]
+    return {'values': pd.Index(uniques), 'order': order, 'starts': starts}
+
+
+def filter_index(df):
+    """Inverted index of df: row positions per ASIN, Product Name and Date, built once per frame."""
+    entry = _INDEXES.get(id(df))
+    if entry is not None and entry[0]() is df:
+        return entry[1]
+    index = {col: _column_index(df[col]) for col in FILTER_COLUMNS if col in df.columns}
+    with _INDEX_LOCK:
+        frame_id = id(df)
+        ref = weakref.ref(df, lambda ref, frame_id=frame_id: _forget_index(ref, frame_id))
+        _INDEXES[frame_id] = (ref, index)
+    return index
+
+
+def _selected_positions(column_index, selected):
+    keys = column_index['values'].get_indexer(pd.Index(list(selected)))
+    keys = np.unique(keys[keys >= 0])
+    order, starts = column_index['order'], column_index['starts']
+    chunks = [order[starts[k]:starts[k + 1]] for k in keys]
+    if not chunks:
+        return np.empty(0, dtype=np.intp)
+    return np.sort(np.concatenate(chunks))
+
+
+@traced()
+def filter_rows(df, dates=None, asins=None, products=None):
+    """
+    Rows of df whose Date, ASIN and Product Name are in the non-empty selections, like
+    chained isin() filters. Columns df does not have are not filtered.
+
+    Selections are resolved on the frame's inverted index and intersected, so the cost
+    follows the selected rows. Without an active selection df itself is returned, so
+    the result must be copied before it is modified.
+    """
+    selections = {'Date': dates, 'ASIN': asins, 'Product Name': products}
+    active = {col: values for col, values in selections.items() if values and col in df.columns}
+    if not active:
+        return df
+    index = filter_index(df)
+    positions = None
+    for col, values in active.items():
+        selected = _selected_positions(index[col], values)
+        positions = selected if positions is None else np.intersect1d(positions, selected, assume_unique=True)
+    return df.take(positions)
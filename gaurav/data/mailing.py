@@ -0,0 +1,224 @@
+import ssl
+import time
+import base64
+import smtplib
+import threading
+import socketserver
+from email import encoders
+from email.mime.base import MIMEBase
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+import config
+
+
+def build_message(sender_email, subject, text=None, html=None, attachments=()):
+    """
+    Mail rendered once for a whole batch; send_batch() only sets the To header per
+    receiver. attachments are (file name, bytes) pairs.
+    """
+    message = MIMEMultipart()
+    message["From"] = sender_email
+    message["Subject"] = subject
+    if text:
+        message.attach(MIMEText(text, "plain"))
+    if html:
+        message.attach(MIMEText(html, "html"))
+    for file_name, payload in attachments:
+        part = MIMEBase("application", "octet-stream")
+        part.set_payload(payload)
+        encoders.encode_base64(part)
+        part.add_header("Content-Disposition", "attachment", filename=file_name)
+        message.attach(part)
+    return message
+
+
+def _is_transient(error):
+    """Dropped connections, network errors and 4xx replies are worth another try."""
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+
+
+def smtp_account_error():
+    """Why mail cannot be sent from the server's account (config.SMTP_USER), or None when it can."""
+    if config.SMTP_DEBUG or (config.SMTP_USER and config.SMTP_PASSWORD):
+        return None
+    return "GU_SMTP_USER and GU_SMTP_PASSWORD are not set on the server."
+
+
+def _connect(sender_email, password):
+    server = smtplib.SMTP(config.SMTP_HOST, config.SMTP_PORT, timeout=config.SMTP_TIMEOUT)
+    try:
+        # The local debugging server takes mail without TLS, and without login unless it asks for one
+        if not config.SMTP_DEBUG:
+            server.starttls(context=ssl.create_default_context())
+            server.login(sender_email, password)
+        else:
+            server.ehlo_or_helo_if_needed()
+            if server.has_extn("auth"):
+                server.login(sender_email, password)
+    except Exception:
+        server.close()
+        raise
+    return server
+
+
+def _disconnect(server):
+    try:
+        server.quit()
+    except (smtplib.SMTPException, OSError):
+        server.close()
+
+
+def send_batch(sender_email, password, receivers, message):
+    """
+    Send message to every receiver over one authenticated connection, opening a new one
+    every SMTP_MESSAGES_PER_CONNECTION messages.
+
+    Transient failures reconnect and retry up to SMTP_RETRIES times, waiting
+    SMTP_BACKOFF_SECONDS, then twice as long, and so on. A rejected login fails the
+    rest of the batch at once. Returns {receiver: error text} for the receivers that were
+    not reached, empty when every mail went out.
+    """
+    failures = {}
+    server = None
+    sent = 0
+    try:
+        for i, receiver in enumerate(receivers):
+            for attempt in range(config.SMTP_RETRIES + 1):
+                try:
+                    if server is not None and sent >= config.SMTP_MESSAGES_PER_CONNECTION:
+                        _disconnect(server)
+                        server = None
+                    if server is None:
+                        try:
+                            server = _connect(sender_email, password)
+                        except Exception as e:
+                            if _is_transient(e):
+                                raise
+                            failures.update({r: str(e) for r in receivers[i:]})
+                            return failures
+                        sent = 0
+                    del message["To"]
+                    message["To"] = receiver
+                    server.sendmail(sender_email, [receiver], message.as_string())
+                    sent += 1
+                    failures.pop(receiver, None)
+                    break
+                except Exception as e:
+                    failures[receiver] = str(e)
+                    if not _is_transient(e) or attempt == config.SMTP_RETRIES:
+                        break
+                    if server is not None:
+                        server.close()
+                        server = None
+                    time.sleep(config.SMTP_BACKOFF_SECONDS * 2 ** attempt)
+    finally:
+        if server is not None:
+            _disconnect(server)
+    return failures
+
+
+def send_mail(sender_email, password, receiver_email, subject, body):
+    """Plain-text mail to one receiver; returns the error text, or None once sent."""
+    failures = send_batch(sender_email, password, [receiver_email], build_message(sender_email, subject, text=body))
+    return failures.get(receiver_email)
+
+
+class _DebugSMTPHandler(socketserver.StreamRequestHandler):
+    def _reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        with self.server.lock:
+            self.server.connections += 1
+            if self.server.connections <= self.server.drop_connections:
+                return
+        self._reply("220 localhost debugging SMTP")
+        sender, receivers = None, []
+        for raw in self.rfile:
+            command = raw.decode(errors="replace").strip()
+            verb = command[:4].upper()
+            if verb == "EHLO" and self.server.credentials is not None:
+                self._reply("250-localhost")
+                self._reply("250 AUTH PLAIN")
+            elif verb in ("HELO", "EHLO"):
+                self._reply("250 localhost")
+            elif verb == "AUTH":
+                # AUTH PLAIN, with the credentials on the same line or the next
+                response = command.split()[2] if len(command.split()) > 2 else None
+                if response is None:
+                    self._reply("334 ")
+                    response = self.rfile.readline().decode(errors="replace").strip()
+                try:
+                    _, user, password = base64.b64decode(response).decode().split("\0")
+                except ValueError:
+                    user = password = None
+                if (user, password) == self.server.credentials:
+                    self._reply("235 2.7.0 Authentication successful")
+                else:
+                    self._reply("535 5.7.8 Authentication credentials invalid")
+            elif verb == "MAIL":
+                sender, receivers = command.partition(":")[2].strip().strip("<>"), []
+                self._reply("250 OK")
+            elif verb == "RCPT":
+                receivers.append(command.partition(":")[2].strip().strip("<>"))
+                self._reply("250 OK")
+            elif verb == "DATA":
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                lines = []
+                for line in self.rfile:
+                    if line.rstrip(b"\r\n") == b".":
+                        break
+                    lines.append(line[1:] if line.startswith(b"..") else line)
+                with self.server.lock:
+                    self.server.messages.append((sender, receivers, b"".join(lines)))
+                self._reply("250 OK")
+            elif verb in ("RSET", "NOOP"):
+                if verb == "RSET":
+                    sender, receivers = None, []
+                self._reply("250 OK")
+            elif verb == "QUIT":
+                self._reply("221 Bye")
+                return
+            else:
+                self._reply("502 Command not implemented")
+
+
+class DebugSMTPServer(socketserver.ThreadingTCPServer):
+    """
+    Local SMTP stand-in for tests and GU_SMTP_DEBUG=1 runs. It takes every mail
+    without TLS and keeps (sender, receivers, raw message) in .messages. Given
+    credentials, a (user, password) pair, it asks for a login and rejects any other.
+    The first drop_connections connections are closed straight away, to exercise retries.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host="localhost", port=config.SMTP_PORT, drop_connections=0, credentials=None):
+        super().__init__((host, port), _DebugSMTPHandler)
+        self.lock = threading.Lock()
+        self.messages = []
+        self.connections = 0
+        self.drop_connections = drop_connections
+        self.credentials = credentials
+
+    def start(self):
+        """Serve from a daemon thread and return the server."""
+        threading.Thread(target=self.serve_forever, name="debug-smtp", daemon=True).start()
+        return self
+
+
+if __name__ == "__main__":
+    # python -m data.mailing: print every mail the dashboard sends while GU_SMTP_DEBUG=1
+    server = DebugSMTPServer(config.SMTP_HOST, config.SMTP_PORT)
+    print(f"Debugging SMTP server on {config.SMTP_HOST}:{config.SMTP_PORT}")
+    seen = 0
+    server.start()
+    while True:
+        time.sleep(1)
+        for sender, receivers, data in server.messages[seen:]:
+            print(f"--- {sender} -> {', '.join(receivers)} ({len(data):,} bytes)")
+        seen = len(server.messages)
@@ -0,0 +1,320 @@
+import os
+import sys
+import json
+import time
+import socket
+import hashlib
+import sqlite3
+import calendar
+import subprocess
+from datetime import datetime, timedelta
+import config
+import analysis as analysis_func
+from .mailing import smtp_account_error
+
+FREQUENCIES = ["Daily", "Weekly", "Monthly", "One-time"]
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Worker process started by this server, and when a running worker was last looked for
+_WORKER = None
+_LAST_CHECK = None
+
+
+# workbook is NULL for schedules that report on the latest upload, else the pinned copy's path
+_SCHEDULES_TABLE = '''
+    CREATE TABLE IF NOT EXISTS {name} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        frequency TEXT NOT NULL,
+        start_at TEXT NOT NULL,
+        weekdays TEXT,
+        monthly_day INTEGER,
+        next_run TEXT,
+        receivers TEXT NOT NULL,
+        subject TEXT NOT NULL,
+        workbook TEXT,
+        num_days INTEGER NOT NULL,
+        performance_filter TEXT,
+        last_run TEXT,
+        last_status TEXT
+    )
+'''
+_MIGRATED_COLUMNS = "id, frequency, start_at, weekdays, monthly_day, next_run, receivers, subject, " \
+                    "num_days, performance_filter, last_run, last_status"
+
+
+def _migrate(conn):
+    """Bring a schedule database written by an older version up to date."""
+    columns = {row["name"] for row in conn.execute("PRAGMA table_info(report_schedules)")}
+    # Schedules used to keep their sender's login; reports now go out from the server account
+    for column in ("password", "sender_email"):
+        if column in columns:
+            with conn:
+                conn.execute(f"ALTER TABLE report_schedules DROP COLUMN {column}")
+    # Schedules used to be tied to the upload they were made from; they now follow the latest
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        workbook = next(row for row in conn.execute("PRAGMA table_info(report_schedules)") if row["name"] == "workbook")
+        if workbook["notnull"]:
+            conn.execute(_SCHEDULES_TABLE.format(name="report_schedules_migrated"))
+            conn.execute(f"INSERT INTO report_schedules_migrated ({_MIGRATED_COLUMNS}) "
+                         f"SELECT {_MIGRATED_COLUMNS} FROM report_schedules")
+            conn.execute("DROP TABLE report_schedules")
+            conn.execute("ALTER TABLE report_schedules_migrated RENAME TO report_schedules")
+            conn.execute("CREATE INDEX IF NOT EXISTS report_schedules_next_run ON report_schedules (next_run)")
+
+
+def _connect():
+    os.makedirs(os.path.dirname(config.SCHEDULE_DB_PATH) or ".", exist_ok=True)
+    conn = sqlite3.connect(config.SCHEDULE_DB_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(_SCHEDULES_TABLE.format(name="report_schedules") + ''';
+        CREATE INDEX IF NOT EXISTS report_schedules_next_run ON report_schedules (next_run);
+        CREATE TABLE IF NOT EXISTS scheduler_lease (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            owner TEXT NOT NULL,
+            heartbeat REAL NOT NULL
+        );
+    ''')
+    _migrate(conn)
+    return conn
+
+
+def next_run_time(frequency, start, after, weekdays=None, monthly_day=None):
+    """
+    First run of a schedule that is at or after start and later than after, or None when a
+    one-time schedule has passed. Runs are at start's time of day; a monthly day past the
+    end of a month runs on its last day.
+    """
+    if frequency == "One-time":
+        return start if start > after else None
+    day = max(start.date(), after.date())
+    # Every weekday and month day comes round within 13 months
+    for _ in range(400):
+        candidate = datetime.combine(day, start.time())
+        if candidate > after:
+            if frequency == "Daily":
+                return candidate
+            if frequency == "Weekly" and WEEKDAYS[day.weekday()] in (weekdays or WEEKDAYS):
+                return candidate
+            if frequency == "Monthly":
+                last_day = calendar.monthrange(day.year, day.month)[1]
+                if day.day == min(monthly_day or 1, last_day):
+                    return candidate
+        day += timedelta(days=1)
+    raise ValueError(f"Unsupported schedule: {frequency}")
+
+
+def pin_report_workbook(uploaded_file):
+    """
+    Keep a copy of the uploaded Performance Tracker workbook for a schedule that should
+    always report on this upload, and return its path. Copies are named by their SHA-256,
+    so schedules pinned to the same file share one.
+    """
+    content = uploaded_file.getvalue()
+    path = os.path.join(config.REPORT_WORKBOOK_DIR, f"{hashlib.sha256(content).hexdigest()}.xlsx")
+    if not os.path.exists(path):
+        os.makedirs(config.REPORT_WORKBOOK_DIR, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    return path
+
+
+def add_report_schedule(receiver_emails, subject, num_days, frequency, start,
+                        weekdays=None, monthly_day=None, performance_filter=None, workbook=None):
+    """
+    Store a report schedule and return its id; the worker picks it up at its next run.
+    Each run reports on the latest upload (config.PERFORMANCE_WORKBOOK_PATH) unless
+    workbook pins it to a pin_report_workbook() copy. Reports are sent from the server's
+    SMTP account (config.SMTP_USER), so no credentials are stored with the schedule.
+    """
+    if frequency not in FREQUENCIES:
+        raise ValueError(f"Unsupported frequency: {frequency}")
+    if smtp_account_error() is not None:
+        raise ValueError(f"Scheduled reports cannot be sent: {smtp_account_error()}")
+    next_run = next_run_time(frequency, start, datetime.now() - timedelta(seconds=1), weekdays, monthly_day)
+    if next_run is None:
+        raise ValueError("The selected time has already passed.")
+    conn = _connect()
+    try:
+        with conn:
+            cursor = conn.execute('''
+                INSERT INTO report_schedules (frequency, start_at, weekdays, monthly_day, next_run,
+                                              receivers, subject, workbook, num_days, performance_filter)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (frequency, start.strftime(TIME_FORMAT), json.dumps(weekdays) if weekdays else None, monthly_day,
+                  next_run.strftime(TIME_FORMAT), json.dumps(list(receiver_emails)), subject,
+                  workbook, int(num_days), json.dumps(list(performance_filter)) if performance_filter else None))
+        return cursor.lastrowid
+    finally:
+        conn.close()
+
+
+def cancel_report_schedule(schedule_id):
+    """Delete a schedule, and its pinned workbook once no other schedule uses it."""
+    conn = _connect()
+    try:
+        with conn:
+            row = conn.execute("SELECT workbook FROM report_schedules WHERE id = ?", (schedule_id,)).fetchone()
+            conn.execute("DELETE FROM report_schedules WHERE id = ?", (schedule_id,))
+            if row is None or row["workbook"] is None:
+                return
+            shared = conn.execute("SELECT 1 FROM report_schedules WHERE workbook = ? LIMIT 1",
+                                  (row["workbook"],)).fetchone()
+        if shared is None and os.path.dirname(row["workbook"]) == config.REPORT_WORKBOOK_DIR \
+                and os.path.exists(row["workbook"]):
+            os.remove(row["workbook"])
+    finally:
+        conn.close()
+
+
+def report_schedules():
+    """Stored schedules, next run first."""
+    conn = _connect()
+    try:
+        rows = conn.execute('''
+            SELECT id, frequency, next_run, receivers, subject, num_days,
+                   CASE WHEN workbook IS NULL THEN 'Latest upload' ELSE 'Pinned upload' END AS workbook,
+                   last_run, last_status
+            FROM report_schedules ORDER BY next_run IS NULL, next_run
+        ''').fetchall()
+    finally:
+        conn.close()
+    return [dict(row, receivers=", ".join(json.loads(row["receivers"]))) for row in rows]
+
+
+def _run_report(row):
+    """Recompute the report from the latest (or pinned) workbook and mail it; returns the run status."""
+    workbook = row["workbook"] or config.PERFORMANCE_WORKBOOK_PATH
+    if not os.path.exists(workbook):
+        raise FileNotFoundError(f"No Performance Tracker workbook at {workbook}")
+    performance_filter = json.loads(row["performance_filter"]) if row["performance_filter"] else None
+    report, num_days = analysis_func.latest_performance_report(workbook, row["num_days"], performance_filter)
+    receivers = json.loads(row["receivers"])
+    failures = analysis_func.send_email_via_hostinger_for_performance_tracker(
+        config.SMTP_USER, receivers, row["subject"], report, config.SMTP_PASSWORD, num_days)
+    if not failures:
+        return f"Sent to {len(receivers)} receivers"
+    return f"Sent to {len(receivers) - len(failures)} of {len(receivers)} receivers; " + \
+        "; ".join(f"{receiver}: {error}" for receiver, error in failures.items())
+
+
+def run_due_reports(now=None, renew=None):
+    """
+    Run every schedule whose next run is due. Before its report is sent a schedule is
+    claimed by moving it to its following run (one-time schedules are finished), which
+    only succeeds while it still has the due time read here, so no report is sent twice
+    even by two workers. renew, when given, is called before each report to extend the
+    worker's lease, and the run stops once it returns False. A run missed while no worker
+    was up is sent once, not once per missed slot. Returns the number of schedules run.
+    """
+    now = now or datetime.now()
+    conn = _connect()
+    run = 0
+    try:
+        due = conn.execute('''
+            SELECT * FROM report_schedules WHERE next_run IS NOT NULL AND next_run <= ? ORDER BY next_run
+        ''', (now.strftime(TIME_FORMAT),)).fetchall()
+        for row in due:
+            if renew is not None and not renew():
+                break
+            start = datetime.strptime(row["start_at"], TIME_FORMAT)
+            weekdays = json.loads(row["weekdays"]) if row["weekdays"] else None
+            next_run = next_run_time(row["frequency"], start, max(now, datetime.now()), weekdays, row["monthly_day"])
+            with conn:
+                claimed = conn.execute('''
+                    UPDATE report_schedules SET next_run = ?, last_status = 'Sending' WHERE id = ? AND next_run = ?
+                ''', (next_run.strftime(TIME_FORMAT) if next_run else None, row["id"], row["next_run"])).rowcount
+            if not claimed:
+                continue
+            try:
+                status = _run_report(row)
+            except Exception as e:
+                status = f"Failed: {e}"
+            with conn:
+                conn.execute("UPDATE report_schedules SET last_run = ?, last_status = ? WHERE id = ?",
+                             (now.strftime(TIME_FORMAT), status, row["id"]))
+            run += 1
+        return run
+    finally:
+        conn.close()
+
+
+def _seconds_to_next_run():
+    conn = _connect()
+    try:
+        next_run = conn.execute("SELECT MIN(next_run) FROM report_schedules").fetchone()[0]
+    finally:
+        conn.close()
+    if next_run is None:
+        return config.SCHEDULER_POLL_SECONDS
+    wait = (datetime.strptime(next_run, TIME_FORMAT) - datetime.now()).total_seconds()
+    return min(max(wait, 1), config.SCHEDULER_POLL_SECONDS)
+
+
+def _hold_lease(owner):
+    """Take or renew the single worker lease; False while another live worker holds it."""
+    conn = _connect()
+    try:
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            lease = conn.execute("SELECT owner, heartbeat FROM scheduler_lease WHERE id = 1").fetchone()
+            now = time.time()
+            if lease is not None and lease["owner"] != owner and now - lease["heartbeat"] < config.SCHEDULER_LEASE_SECONDS:
+                return False
+            conn.execute("INSERT OR REPLACE INTO scheduler_lease (id, owner, heartbeat) VALUES (1, ?, ?)", (owner, now))
+            return True
+    finally:
+        conn.close()
+
+
+def _has_active_schedules():
+    conn = _connect()
+    try:
+        return conn.execute("SELECT 1 FROM report_schedules WHERE next_run IS NOT NULL LIMIT 1").fetchone() is not None
+    finally:
+        conn.close()
+
+
+def _lease_is_live():
+    conn = _connect()
+    try:
+        lease = conn.execute("SELECT heartbeat FROM scheduler_lease WHERE id = 1").fetchone()
+    finally:
+        conn.close()
+    return lease is not None and time.time() - lease["heartbeat"] < config.SCHEDULER_LEASE_SECONDS
+
+
+def run_scheduler_worker():
+    """
+    Worker loop: sleeps until the earliest next run (at most SCHEDULER_POLL_SECONDS,
+    so new schedules are noticed) and runs what is due. Only the lease holder runs; a
+    second worker exits at once, and a crashed worker's lease expires after
+    SCHEDULER_LEASE_SECONDS. The lease is renewed before every report, so a long batch of
+    sends keeps it. Each wake-up reads one indexed row, however many schedules exist.
+    """
+    owner = f"{socket.gethostname()}-{os.getpid()}"
+    while _hold_lease(owner):
+        run_due_reports(renew=lambda: _hold_lease(owner))
+        time.sleep(_seconds_to_next_run())
+
+
+def start_report_scheduler(force=False):
+    """
+    Start the worker process unless one is already running. Cheap enough for every rerun:
+    the schedule database is only consulted once per SCHEDULER_POLL_SECONDS.
+    """
+    global _WORKER, _LAST_CHECK
+    if _WORKER is not None and _WORKER.poll() is None:
+        return
+    now = time.monotonic()
+    if not force and _LAST_CHECK is not None and now - _LAST_CHECK < config.SCHEDULER_POLL_SECONDS:
+        return
+    _LAST_CHECK = now
+    if _lease_is_live() or (not force and not _has_active_schedules()):
+        return
+    package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [package_root, os.environ.get("PYTHONPATH")])))
+    _WORKER = subprocess.Popen([sys.executable, "-c", "import data; data.run_scheduler_worker()"], env=env)
@@ -0,0 +1,159 @@
+import threading
+import numpy as np
+import pandas as pd
+import analysis as analysis_func
+from analysis.read import load_workbook_snapshot, workbook_sha256
+from analysis.store import store_get, store_put
+from analysis.trace import traced
+from analysis.rolling import rolling_frame, extend_rolling_frame, finish_drr
+from analysis.schema import product_dimension, compact_daily_frame
+from analysis.cube import build_overview_cube
+
+ID_COLUMNS = ['ASIN', 'Product Name']
+# Workbook sheet -> value column of the long frame
+DAILY_SHEETS = {'Sales': 'Sales', 'Profit': 'Gross Profit'}
+
+# Hash of the most recently ingested workbook, the base for the next upload while it is still stored
+_LATEST_INGEST = None
+_INGEST_LOCK = threading.Lock()
+
+
+def new_date_columns(previous, current):
+    """
+    Headers of the date columns `current` adds to `previous` when that is the only change:
+    same ID rows and the same values under every existing header, compared by name, so the
+    new dates may be inserted anywhere (the sheets list the newest date first). Returns
+    None when anything else changed, nothing was added, or an added header is not a date
+    missing from `previous`.
+    """
+    previous_columns = list(previous.columns)
+    known_columns = set(previous_columns)
+    if len(previous) != len(current) or not known_columns <= set(current.columns):
+        return None
+    added = [col for col in current.columns if col not in known_columns]
+    if not added or previous.duplicated(ID_COLUMNS).any():
+        return None
+    known_dates = set(analysis_func.header_dates([col for col in previous_columns if col not in ID_COLUMNS]))
+    added_dates = analysis_func.header_dates(added)
+    if added_dates.hasnans or any(date in known_dates for date in added_dates):
+        return None
+    if not previous.equals(current[previous_columns]):
+        return None
+    return added
+
+
+def _full_ingest(uploaded_file, sheets):
+    sales_data = analysis_func.read_sales_data(uploaded_file, "Sales")
+    profit_data = analysis_func.read_gross_profit(uploaded_file, "Profit")
+    merged_data = analysis_func.merge_sales_and_profit(sales_data, profit_data)
+    products = product_dimension(merged_data)
+    start_date = merged_data['Date'].min()
+    merged_data = compact_daily_frame(merged_data, products, start_date)
+    return {
+        'mode': 'full',
+        'wide': {sheet: sheets[sheet] for sheet in DAILY_SHEETS},
+        'products': products,
+        'start_date': start_date,
+        'merged': merged_data,
+        'rolling': rolling_frame(merged_data),
+    }
+
+
+def _incremental_ingest(base, sheets):
+    """Extend `base` with the dates added to Sales and Profit, or None if a full rebuild is needed."""
+    new_columns = {}
+    for sheet in DAILY_SHEETS:
+        if sheet not in sheets:
+            return None
+        new_columns[sheet] = new_date_columns(base['wide'][sheet], sheets[sheet])
+        if new_columns[sheet] is None:
+            return None
+    sales_dates = analysis_func.header_dates(new_columns['Sales']).sort_values()
+    if not sales_dates.equals(analysis_func.header_dates(new_columns['Profit']).sort_values()):
+        return None
+
+    # Only the new columns are melted and merged
+    melted = [
+        analysis_func.melt_daily_sheet(sheets[sheet][ID_COLUMNS + new_columns[sheet]], value_name)
+        for sheet, value_name in DAILY_SHEETS.items()
+    ]
+    new_rows = pd.merge(melted[0], melted[1], on=['ASIN', 'Date', 'Product Name'], how='inner')
+    merged = base['merged']
+    # Any number of new days is fine, but only after the last known one: an earlier day would
+    # change the rolling windows of rows already computed
+    if new_rows.empty or new_rows['Date'].min() <= merged['Date'].max():
+        return None
+    if not merged.index.equals(pd.RangeIndex(len(merged))):
+        return None
+
+    # A full read melts the columns in sheet order, one block of rows per date; put the new
+    # blocks where their columns are and renumber the rows (and the rolling frame) to match
+    sheet_dates = analysis_func.header_dates([col for col in sheets['Sales'].columns if col not in ID_COLUMNS])
+    if not sheet_dates.is_unique:
+        return None
+    blocks = sheet_dates.get_indexer(pd.concat([merged['Date'], new_rows['Date']], ignore_index=True))
+    if (blocks < 0).any():
+        return None
+    order = np.argsort(blocks, kind='stable')
+    row_numbers = np.empty(len(order), dtype=np.int64)
+    row_numbers[order] = np.arange(len(order))
+
+    new_rows = compact_daily_frame(new_rows, base['products'], base['start_date'])
+    new_rows.index = row_numbers[len(merged):]
+    rolling = base['rolling'].copy(deep=False)
+    rolling.index = row_numbers[rolling.index.to_numpy()]
+    merged = pd.concat([merged, new_rows], ignore_index=True).take(order).reset_index(drop=True)
+    analysis_func.write_artifact("merged_data", merged)
+    return {
+        'mode': 'incremental',
+        'wide': {sheet: sheets[sheet] for sheet in DAILY_SHEETS},
+        'products': base['products'],
+        'start_date': base['start_date'],
+        'merged': merged,
+        'rolling': extend_rolling_frame(rolling, new_rows),
+    }
+
+
+@traced()
+def ingest_workbook(uploaded_file):
+    """
+    Long Sales/Profit data, rolling DRR statistics, the overview cube, inventory and US
+    products for a workbook.
+
+    When the workbook only adds later date columns to Sales and Profit of the previously
+    ingested one (the daily upload), just the new columns are melted and merged and the
+    rolling statistics are computed for the new dates only; anything else is a full
+    rebuild. The returned dict lives in the snapshot store, shared between sessions
+    (see store_get).
+    """
+    global _LATEST_INGEST
+    sha256 = workbook_sha256(uploaded_file)
+    state = store_get(sha256, 'ingest')
+    if state is not None:
+        return state
+
+    with _INGEST_LOCK:
+        state = store_get(sha256, 'ingest')
+        if state is None:
+            sheets = load_workbook_snapshot(uploaded_file)
+            base = store_get(_LATEST_INGEST, 'ingest')
+            if base is not None:
+                state = _incremental_ingest(base, sheets)
+            if state is None:
+                state = _full_ingest(uploaded_file, sheets)
+            state['sha256'] = sha256
+            state['inventory'] = analysis_func.read_inventory_data(uploaded_file, "Inventory")
+            state['us_products'] = analysis_func.calculate.read_us_products_data(uploaded_file, "US Products")
+            state['cube'] = build_overview_cube(state['merged'], state['products'], state['start_date'])
+            state = store_put(sha256, 'ingest', state)
+            _LATEST_INGEST = sha256
+    return state
+
+
+@traced()
+def workbook_drr(workbook_hash, merged_data, use_manual_drr=False, manual_drr_value=None):
+    """calculate_normal_drr() for an ingested workbook, reusing its rolling statistics when available."""
+    state = store_get(workbook_hash, 'ingest')
+    if state is None:
+        return analysis_func.calculate.calculate_normal_drr(merged_data, use_manual_drr, manual_drr_value)
+    return finish_drr(state['rolling'], use_manual_drr, manual_drr_value)
@@ -0,0 +1,83 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import threading
+from datetime import datetime
+import config
+from analysis.read import workbook_sha256
+from analysis.trace import traced
+from .executor import submit_job, job_status
+
+# Workbook SHA-256 -> id of the compute job building its snapshot
+_REBUILDS = {}
+_UPLOAD_LOCK = threading.Lock()
+
+
+def rebuild_snapshot(path, sha256):
+    """
+    Id of the job parsing the workbook version sha256 (stored at path) into its snapshot.
+    The job is submitted once per version, every session waiting on the version shares it.
+    """
+    with _UPLOAD_LOCK:
+        job_id = _REBUILDS.get(sha256)
+        if job_id is None or job_status(job_id)['state'] in ('cancelling', 'cancelled', 'unknown'):
+            job_id = submit_job('workbook_snapshot', sha256, {'path': path})
+            _REBUILDS[sha256] = job_id
+        return job_id
+
+
+def _log_upload(entry):
+    os.makedirs(os.path.dirname(config.INGEST_LOG_PATH) or ".", exist_ok=True)
+    with open(config.INGEST_LOG_PATH, "a") as f:
+        f.write(json.dumps(entry) + "\n")
+
+
+@traced()
+def save_upload(uploaded_file, path=config.SAVED_FILE_PATH, user=None):
+    """
+    Store an uploaded workbook at path and return (its SHA-256, whether path changed).
+
+    The uploader hands the same file to every rerun, so nothing is written when the
+    content is already at path. A new workbook is streamed to a temporary file next to
+    path and renamed over it, so other sessions read the old or the new workbook and
+    never a partial one; the upload is then appended to config.INGEST_LOG_PATH and its
+    snapshot build is started.
+    """
+    digest = hashlib.sha256()
+    uploaded_file.seek(0)
+    for chunk in iter(lambda: uploaded_file.read(1 << 20), b''):
+        digest.update(chunk)
+    sha256 = digest.hexdigest()
+
+    with _UPLOAD_LOCK:
+        previous = workbook_sha256(path) if os.path.exists(path) else None
+        if previous == sha256:
+            return sha256, False
+
+        directory = os.path.dirname(path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".upload-", suffix=".xlsx")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                uploaded_file.seek(0)
+                shutil.copyfileobj(uploaded_file, f, 1 << 20)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        _log_upload({
+            'time': datetime.now().isoformat(timespec='seconds'),
+            'sha256': sha256,
+            'previous_sha256': previous,
+            'bytes': os.path.getsize(path),
+            'name': getattr(uploaded_file, 'name', None),
+            'user': user,
+        })
+    rebuild_snapshot(path, sha256)
+    return sha256, True
@@ -0,0 +1,73 @@
+import email
+import pytest
+import config
+from data.mailing import DebugSMTPServer, build_message, send_batch
+
+ACCOUNT = ("reports@example.com", "secret")
+
+
+@pytest.fixture
+def smtp_server(monkeypatch):
+    """Start a DebugSMTPServer on a free port with the given options and send mail to it."""
+    servers = []
+
+    def start(**options):
+        server = DebugSMTPServer("localhost", 0, **options).start()
+        servers.append(server)
+        monkeypatch.setattr(config, "SMTP_DEBUG", True)
+        monkeypatch.setattr(config, "SMTP_HOST", "localhost")
+        monkeypatch.setattr(config, "SMTP_PORT", server.server_address[1])
+        monkeypatch.setattr(config, "SMTP_TIMEOUT", 5)
+        monkeypatch.setattr(config, "SMTP_BACKOFF_SECONDS", 0)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def _send(receivers, password=ACCOUNT[1]):
+    return send_batch(ACCOUNT[0], password, receivers, build_message(ACCOUNT[0], "Report", text="Numbers"))
+
+
+def test_send_batch_retries_dropped_connections(smtp_server, monkeypatch):
+    monkeypatch.setattr(config, "SMTP_RETRIES", 3)
+    server = smtp_server(drop_connections=2)
+
+    assert _send(["a@example.com"]) == {}
+    assert server.connections == 3
+    assert [receivers for _, receivers, _ in server.messages] == [["a@example.com"]]
+
+
+def test_send_batch_gives_up_after_retries(smtp_server, monkeypatch):
+    monkeypatch.setattr(config, "SMTP_RETRIES", 2)
+    server = smtp_server(drop_connections=10)
+
+    failures = _send(["a@example.com"])
+    assert list(failures) == ["a@example.com"]
+    assert server.connections == 3
+    assert server.messages == []
+
+
+def test_send_batch_reconnects_every_few_messages(smtp_server, monkeypatch):
+    monkeypatch.setattr(config, "SMTP_MESSAGES_PER_CONNECTION", 2)
+    server = smtp_server(credentials=ACCOUNT)
+    receivers = [f"user{i}@example.com" for i in range(5)]
+
+    assert _send(receivers) == {}
+    assert server.connections == 3
+    sent = [(sender, receivers, email.message_from_bytes(data)["To"]) for sender, receivers, data in server.messages]
+    assert sent == [(ACCOUNT[0], [receiver], receiver) for receiver in receivers]
+
+
+def test_send_batch_rejected_login_fails_the_batch(smtp_server):
+    server = smtp_server(credentials=ACCOUNT)
+    receivers = ["a@example.com", "b@example.com"]
+
+    failures = _send(receivers, password="wrong")
+    assert sorted(failures) == receivers
+    assert all("535" in error for error in failures.values())
+    # Not transient: no retry and no connection per receiver
+    assert server.connections == 1
+    assert server.messages == []
@@ -7,20 +7,38 @@ import components as gu_tabs
 import ui as gu_css
 import os
 import components as gu_comp
+import data as data_func
+import analysis as analysis_func
 import pandas as pd
 import shutil
 
 def main():
-    if not gu_auth.login_check_and_sidebar_actions():
+    # Each rerun is traced as a waterfall of its stages (with GU_TRACE=1)
+    analysis_func.start_trace_run("dashboard", user=st.session_state.get("current_user"))
+    try:
+        run_dashboard()
+    finally:
+        analysis_func.finish_trace_run()
+
+def run_dashboard():
+    with analysis_func.trace_span("login"):
+        logged_in = gu_auth.login_check_and_sidebar_actions()
+    if not logged_in:
         return
-    if gu_auth.manage_users():
+    with analysis_func.trace_span("user management"):
+        managing_users = gu_auth.manage_users()
+    if managing_users:
         return
     
     # Custom CSS styling
     gu_css.apply_custom_css()
 
+    # Brings the report scheduler worker back after a restart while schedules are stored
+    data_func.start_report_scheduler()
+
     # Handle file operations (upload, update, delete)
-    file_path = gu_comp.handle_file_operations()
+    with analysis_func.trace_span("file handling"):
+        file_path = gu_comp.handle_file_operations()
     
 
     if file_path is None:
@@ -29,70 +47,52 @@ def main():
 
     try:
         # Proceed with loading the data from the file
-        with st.spinner(gu_lang.LangConfig.get("LOADING_DATA")):
+        with st.spinner(gu_lang.LangConfig.get("LOADING_DATA")), analysis_func.trace_span("load data"):
             merged_data, inventory_data, us_products_data, inventory_status = gu_tabs.load_all_data_first(file_path)
 
         # Global Filters in Sidebar
         st.sidebar.header(gu_lang.LangConfig.get("GLOBAL_FILTERS"))
-        selected_dates, selected_asins, selected_products = gu_tabs.setup_global_filters(merged_data)
-
-        # Function to apply filters to any dataframe
-        def apply_filters(df):
-            filtered_df = df.copy()
-            if 'Date' in df.columns and selected_dates:
-                filtered_df = filtered_df[filtered_df['Date'].isin(selected_dates)]
-            if 'ASIN' in df.columns and selected_asins:
-                filtered_df = filtered_df[filtered_df['ASIN'].isin(selected_asins)]
-            if 'Product Name' in df.columns and selected_products:
-                filtered_df = filtered_df[filtered_df['Product Name'].isin(selected_products)]
-            return filtered_df
-
-        # Apply filters to all relevant dataframes
-        filtered_merged_data = apply_filters(merged_data)
-        filtered_inventory_status = apply_filters(inventory_status)
-        filtered_inventory_data = apply_filters(inventory_data)
-
-        # Create tabs
-        tabs = st.tabs(config.DASHBOARD_TABS)
-
-        # Overview Tab
-        with tabs[0]:
-            gu_tabs.display_overview_tab(filtered_merged_data)
-
-        # Inventory Status Tab
-        with tabs[1]:
-            gu_tabs.display_inventory_status_tab(filtered_inventory_status, filtered_inventory_data)
-
-        # Shipment Planning Tab
-        with tabs[2]:
-            gu_tabs.display_shipment_planning_tab(filtered_inventory_status)
-
-        # Loss Analysis Tab
-        with tabs[3]:
-            gu_tabs.display_loss_analysis_tab(selected_dates, file_path)
-
-        # Profit Analysis Tab
-        with tabs[4]:
-            gu_tabs.display_profit_sale_analysis_tab(apply_filters, file_path)
-
-        # Maximum DRR Analysis Tab
-        with tabs[5]:
-            gu_tabs.display_max_drr_analysis_tab(apply_filters, inventory_data)
-
-        with tabs[6]:
-            gu_tabs.display_daily_drr_calculator_tab(file_path)
-
-        with tabs[7]:
-            gu_tabs.display_label_planning_tab(file_path, inventory_status, selected_dates, selected_asins, selected_products)
-
-        with tabs[8]:
-            gu_tabs.display_target_sale_mang_tab()
-
-        with tabs[9]:
-            gu_tabs.display_us_product_shipment_planing_tab(us_products_data, filtered_inventory_status)
-
-        with tabs[10]:
-            gu_tabs.display_sale_profit_any_tool_tab(file_path)
+        with analysis_func.trace_span("filters"):
+            selected_dates, selected_asins, selected_products = gu_tabs.setup_global_filters(merged_data)
+        if gu_auth.login.has_permission('manage_users'):
+            gu_tabs.display_cache_stats()
+            gu_tabs.display_performance_panel()
+
+        # Function to apply filters to any dataframe (an unfiltered frame is returned as it is)
+        def apply_filters(df, filter_dates=True):
+            return data_func.filter_rows(df, selected_dates if filter_dates else None, selected_asins, selected_products)
+
+        # What filtered_inventory_status() depends on, for tabs that memoize results computed from it
+        st.session_state.inventory_filter_key = (st.session_state.workbook_key, tuple(selected_asins),
+                                                 tuple(selected_products))
+        # Inventory status is a current snapshot (latest DRR per ASIN), so the date filter does not apply
+        filtered_inventory_status = lambda: apply_filters(inventory_status, filter_dates=False)
+
+        # Only the selected tab computes its data and widgets on a rerun
+        active_tab = gu_tabs.select_active_tab()
+        tab_renderers = [
+            # Overview Tab
+            lambda: gu_tabs.display_overview_tab(gu_comp.load_overview_cube(file_path, st.session_state.workbook_key[0]),
+                                                 selected_dates, selected_asins, selected_products,
+                                                 apply_filters(merged_data)),
+            # Inventory Status Tab
+            lambda: gu_tabs.display_inventory_status_tab(filtered_inventory_status(), apply_filters(inventory_data)),
+            # Shipment Planning Tab
+            lambda: gu_tabs.display_shipment_planning_tab(filtered_inventory_status()),
+            # Loss Analysis Tab
+            lambda: gu_tabs.display_loss_analysis_tab(selected_dates, file_path),
+            # Profit Analysis Tab
+            lambda: gu_tabs.display_profit_sale_analysis_tab(apply_filters, file_path),
+            # Maximum DRR Analysis Tab
+            lambda: gu_tabs.display_max_drr_analysis_tab(selected_asins, selected_products),
+            lambda: gu_tabs.display_daily_drr_calculator_tab(file_path),
+            lambda: gu_tabs.display_label_planning_tab(file_path, inventory_status, selected_asins, selected_products),
+            lambda: gu_tabs.display_target_sale_mang_tab(),
+            lambda: gu_tabs.display_us_product_shipment_planing_tab(us_products_data, filtered_inventory_status()),
+            lambda: gu_tabs.display_sale_profit_any_tool_tab(file_path),
+        ]
+        with analysis_func.trace_span(f"tab: {active_tab}"):
+            tab_renderers[config.DASHBOARD_TABS.index(active_tab)]()
 
         # Display title if the user has permission
         if gu_auth.login.has_permission('read'):